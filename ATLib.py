@@ -1,4 +1,5 @@
 import requests
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 import csv
 import re
@@ -23,82 +24,51 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 import tempfile
+import psutil
+import pytz
+import LottoLib as lt
 from pypnf import PointFigureChart
-from collections import Counter
-from itertools import combinations
-
-
-def generar_lotto_recomanacio():
-    # --- CONFIGURACIÓ DE DESCÀRREGA ---
-    FITXER_PRIMI = "Lotoideas.com - Histórico de Resultados - Primitiva - 2013 a 202X(1).csv"
-    FITXER_BONO = "Lotoideas.com - Histórico de Resultados - Bonoloto - 2013 a 202X(1).csv"
-    HEADERS = {'User-Agent': 'Mozilla/5.0'}
-    
-    print("🛰️ Actualitzant dades de loteria des de la web...")
-    tasques = [
-        ("https://www.lotoideas.com/primitiva-resultados-historicos-de-todos-los-sorteos/", FITXER_PRIMI, "gid=1"),
-        ("https://www.lotoideas.com/bonoloto-resultados-historicos-de-todos-los-sorteos/", FITXER_BONO, "gid=0")
-    ]
-    
-    for url, nom, gid in tasques:
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+import time
+import hashlib
+import json
+import math
+import bisect
+import unicodedata
+import io
+import queue
+import shutil
+import atexit
+from contextlib import contextmanager
+
+
+# Les dades de loteria viuen al magatzem binari de LottoLib, que només baixa
+# els CSV de Lotoideas quan han canviat i hi afegeix els sorteigs nous
+def descarregar_lotto():
+    lt.actualitzar_sorteigs()
+
+def generar_lotto_recomanacio(actualitzar=True):
+    # Amb actualitzar=False es fan servir les dades ja guardades (p. ex. pel refresc periòdic)
+    if actualitzar:
         try:
-            r = requests.get(url, headers=HEADERS, timeout=10)
-            soup = BeautifulSoup(r.text, 'html.parser')
-            link = next((a['href'] for a in soup.find_all('a', href=True) if "output=csv" in a['href'] and gid in a['href']), None)
-            if link:
-                with open(nom, 'wb') as f: 
-                    f.write(requests.get(link).content)
-                print(f"✅ {nom} actualitzat.")
+            descarregar_lotto()
         except Exception as e:
-            print(f"⚠️ Error descarregant {nom}: {e}")
+            print(f"⚠️ {e}, fem servir les dades locals.")
 
     # --- LÒGICA D'ANÀLISI (90 DIES) ---
     avui = datetime.now()
-    lim_mom = avui - timedelta(days=30)
-    lim_biaix = avui - timedelta(days=90)
-
-    stats_mom, stats_hist, triplets_cnt = Counter(), Counter(), Counter()
-    sort_mom = 0
-
-    for f_nom in [FITXER_PRIMI, FITXER_BONO]:
-        if os.path.exists(f_nom):
-            with open(f_nom, mode='r', encoding='utf-8') as f:
-                reader = csv.reader(f); next(reader)
-                for fila in reader:
-                    if len(fila) < 7: continue
-                    dt = None
-                    d_str = fila[0].split(' ')[0].replace('-', '/')
-                    for fmt in ["%d/%m/%Y", "%Y/%m/%d"]:
-                        try: dt = datetime.strptime(d_str, fmt); break
-                        except: continue
-                    
-                    if not dt: continue
-                    nums = sorted([int(n) for n in fila[1:7] if n.strip().isdigit()])
-                    
-                    if dt >= lim_mom:
-                        sort_mom += 1
-                        for n in nums: stats_mom[n] += 1
-                    if dt >= lim_biaix:
-                        for n in nums: stats_hist[n] += 1
-                        for t in combinations(nums, 3): triplets_cnt[t] += 1
-
-    scores = []
-    top_triplets = [t for t, _ in triplets_cnt.most_common(50)]
-    for n in range(1, 50):
-        punts = 0
-        if stats_mom[n] > (sort_mom * 0.15): punts += 45 
-        if stats_hist[n] > 0: punts += (stats_hist[n] * 0.7)
-        for t in top_triplets:
-            if n in t: punts += 12
-        scores.append((n, punts))
-
-    scores.sort(key=lambda x: x[1], reverse=True)
-    ap_a = sorted([n for n, p in scores[:6]])
-    ap_b = sorted([n for n, p in scores[6:12]])
+    dies, nums = lt.carregar_magatzem()
+    # Com al backtest: els sorteigs anteriors al dia del sorteig que es recomana
+    ap_a, ap_b = lt.recomanacio(dies, nums, proper_sorteig())
+    # El text es reutilitza fins al proper sorteig: diem fins on arriben les dades
+    ultim = lt.ultim_sorteig()
+    text_dades = f"📊 Dades fins al sorteig del {ultim.strftime('%d/%m/%Y')}" if ultim else "📊 Sense sorteigs guardats"
     
     return (
         f"🎯 *LOTERIA DE DADES* - {avui.strftime('%d/%m/%Y')}\n"
-        f"📊 Dades actualitzades ara mateix\n"
+        f"{text_dades}\n"
         f"━━━━━━━━━━━━━━━━━━━━\n"
         f"🎰 *APOSTA PRINCIPAL*\n"
         f"`{' - '.join(f'{n:02d}' for n in ap_a)}`\n\n"
@@ -108,37 +78,147 @@ def generar_lotto_recomanacio():
         f"💰 _Cost: 13,00€ / setmana_"
     )
 
+# --- RECOMANACIÓ DEL DIA (CACHE FINS AL PROPER SORTEIG) ---
+# Bonoloto sorteja de dilluns a dissabte (i la Primitiva dl, dj i ds) cap a les
+# 21:30 hora peninsular. La recomanació es calcula un cop per sorteig i per
+# estat de les dades: la clau és (proper sorteig, últim sorteig guardat), de
+# manera que quan Lotoideas publica el resultat (hores després del sorteig) la
+# recomanació es torna a calcular amb el sorteig nou. Mentre les dades no
+# inclouen l'últim sorteig celebrat, loteria_del_dia() les torna a demanar
+# (GET condicional) a cada crida.
+DIES_SORTEIG = {0, 1, 2, 3, 4, 5}  # dilluns = 0
+HORA_SORTEIG = (21, 30)
+ZONA_SORTEIG = pytz.timezone("Europe/Madrid")
+
+_loteria_cache = (None, None)  # (clau, text): es substitueix sencer, es pot llegir sense lock
+_lock_loteria = threading.Lock()  # només per al càlcul
+
+
+def proper_sorteig(ara=None):
+    ara = ara or datetime.now(ZONA_SORTEIG)
+    dia = ara.date()
+    if ara.weekday() in DIES_SORTEIG and (ara.hour, ara.minute) < HORA_SORTEIG:
+        return dia
+    dia += timedelta(days=1)
+    while dia.weekday() not in DIES_SORTEIG:
+        dia += timedelta(days=1)
+    return dia
+
+
+def sorteig_anterior(ara=None):
+    # Dia de l'últim sorteig ja celebrat
+    ara = ara or datetime.now(ZONA_SORTEIG)
+    dia = ara.date()
+    if ara.weekday() in DIES_SORTEIG and (ara.hour, ara.minute) >= HORA_SORTEIG:
+        return dia
+    dia -= timedelta(days=1)
+    while dia.weekday() not in DIES_SORTEIG:
+        dia -= timedelta(days=1)
+    return dia
+
+
+def _clau_loteria():
+    return proper_sorteig(), lt.ultim_sorteig()
+
+
+def loteria_en_cache():
+    # Retorna el text si ja està calculat per al proper sorteig amb les dades
+    # guardades, o None. No espera mai el càlcul en curs: es crida des del bucle del bot.
+    clau, text = _loteria_cache
+    if clau == _clau_loteria():
+        return text
+    return None
+
+
+def loteria_del_dia():
+    global _loteria_cache
+    # Un sol càlcul per clau encara que arribin moltes peticions alhora
+    with _lock_loteria:
+        text = loteria_en_cache()
+        ultim = lt.ultim_sorteig()
+        if text is not None and ultim is not None and ultim >= sorteig_anterior():
+            return text
+        try:
+            descarregar_lotto()
+        except Exception as e:
+            print(f"⚠️ {e}, fem servir les dades locals.")
+        clau = _clau_loteria()
+        if _loteria_cache[0] != clau:
+            text = generar_lotto_recomanacio(actualitzar=False)
+            _loteria_cache = (clau, f"{text}\n🗓️ _Per al sorteig del {clau[0].strftime('%d/%m/%Y')}_")
+        return _loteria_cache[1]
+
+# --- SESSIÓ HTTP COMPARTIDA ---
+# Una sola sessió amb connexions keep-alive i reintents per a tot el scraping
+# amb requests (receptes, diesel...). Cada secció en limita els fils; el pool de
+# connexions n'ha d'admetre tants com la que més en fa servir.
+HEADERS_HTTP = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0 Safari/537.36"
+}
+TIMEOUT_HTTP = 10
+MAX_CONNEXIONS_HTTP = 16
+
+_sessio = None
+_lock_sessio = threading.Lock()
+
+
+def _sessio_http():
+    global _sessio
+    with _lock_sessio:
+        if _sessio is None:
+            sessio = requests.Session()
+            adaptador = requests.adapters.HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=MAX_CONNEXIONS_HTTP,
+                max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=[502, 503, 504]),
+            )
+            sessio.mount("https://", adaptador)
+            sessio.mount("http://", adaptador)
+            sessio.headers.update(HEADERS_HTTP)
+            _sessio = sessio
+        return _sessio
+
 # Funcions per obtenir les receptes d'allstendres
+URL_RECEPTES = 'https://allstendres.blogspot.com'
+
+def _parsejar_index(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    index_receptes = soup.find('h2', text='Index de Receptes')
+    if not index_receptes:
+        print('No s\'ha trobat cap índex de receptes a la pàgina.')
+        return None
+    # Trobem tots els enllaços de receptes a partir de l'índex de receptes
+    return [enllac['href'] for enllac in index_receptes.find_next('ul').find_all('a', href=True)]
+
+def _parsejar_recepta(html):
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Obtener el nombre de la receta
+    nom_recepta_tag = soup.find('h3', class_='post-title')
+    nom_recepta = nom_recepta_tag.text.strip() if nom_recepta_tag else "Nom de la recepta no trobat"
+
+    # Obtener el contenido de la receta
+    contingut_recepta_tag = soup.find('div', class_='post-body')
+    contingut_recepta = contingut_recepta_tag.get_text(separator='\n').strip() if contingut_recepta_tag else "Contingut de la recepta no trobat"
+
+    return nom_recepta, contingut_recepta
+
 def obtenir_enllacos_des_de_pagina_principal(url_principal):
-    resposta = requests.get(url_principal)
+    resposta = _sessio_http().get(url_principal, timeout=TIMEOUT_HTTP)
     if resposta.status_code == 200:
-        soup = BeautifulSoup(resposta.content, 'html.parser')
-        enllacos = []
-        index_receptes = soup.find('h2', text='Index de Receptes')
-        if index_receptes:
-            # Trobem tots els enllaços de receptes a partir de l'índex de receptes
-            for enllac in index_receptes.find_next('ul').find_all('a', href=True):
-                enllacos.append(enllac['href'])
-            return enllacos
-        else:
-            print('No s\'ha trobat cap índex de receptes a la pàgina.')
-            return None
+        return _parsejar_index(resposta.content)
     else:
         print('Error en carregar la pàgina principal:', resposta.status_code)
         return None
 
 def obtenir_recepta(enllac_recepta):
-    resposta = requests.get(enllac_recepta)
+    try:
+        resposta = _sessio_http().get(enllac_recepta, timeout=TIMEOUT_HTTP)
+    except requests.RequestException as e:
+        print(f"⚠️ Error llegint la recepta {enllac_recepta}: {e}")
+        return "Error en carregar la recepta."
     if resposta.status_code == 200:
-        soup = BeautifulSoup(resposta.content, 'html.parser')
-        
-        # Obtener el nombre de la receta
-        nom_recepta_tag = soup.find('h3', class_='post-title')
-        nom_recepta = nom_recepta_tag.text.strip() if nom_recepta_tag else "Nom de la recepta no trobat"
-        
-        # Obtener el contenido de la receta
-        contingut_recepta_tag = soup.find('div', class_='post-body')
-        contingut_recepta = contingut_recepta_tag.get_text(separator='\n').strip() if contingut_recepta_tag else "Contingut de la recepta no trobat"
+        nom_recepta, contingut_recepta = _parsejar_recepta(resposta.content)
         
         # Construir el texto final de la receta
         text_recepta = f"{nom_recepta}\n\n{contingut_recepta}\n\n{enllac_recepta}"
@@ -148,6 +228,228 @@ def obtenir_recepta(enllac_recepta):
     else:
         return "Error en carregar la recepta."
 
+# --- CATÀLEG LOCAL DE RECEPTES ---
+# L'índex del blog i totes les receptes es guarden a FITXER_RECEPTES i a memòria.
+# Cada refresc revalida amb peticions condicionals (ETag / Last-Modified), de
+# manera que /receptes i /selecciona no fan cap petició a la xarxa.
+FITXER_RECEPTES = "receptes.json"
+MAX_FILS_RECEPTES = 8
+
+_cataleg = None  # {"index": {...}, "enllacos": [...], "receptes": {url: {...}}}
+_lock_cataleg = threading.Lock()
+_lock_refresc_cataleg = threading.Lock()  # un sol refresc alhora (comparteixen FITXER_RECEPTES)
+
+
+def _cataleg_buit():
+    return {"index": {}, "enllacos": [], "receptes": {}}
+
+
+def _carregar_cataleg():
+    global _cataleg
+    with _lock_cataleg:
+        if _cataleg is None:
+            try:
+                with open(FITXER_RECEPTES, encoding='utf-8') as f:
+                    _cataleg = json.load(f)
+            except (OSError, ValueError):
+                _cataleg = _cataleg_buit()
+        return _cataleg
+
+
+def _guardar_cataleg(cataleg):
+    temporal = FITXER_RECEPTES + ".tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(cataleg, f, ensure_ascii=False)
+    os.replace(temporal, FITXER_RECEPTES)
+
+
+def _get_condicional(url, validadors):
+    # Retorna la resposta, o None si el servidor diu que no ha canviat (304)
+    capcaleres = {}
+    if validadors.get("etag"):
+        capcaleres["If-None-Match"] = validadors["etag"]
+    if validadors.get("last_modified"):
+        capcaleres["If-Modified-Since"] = validadors["last_modified"]
+    resposta = _sessio_http().get(url, headers=capcaleres, timeout=TIMEOUT_HTTP)
+    if resposta.status_code == 304:
+        return None
+    resposta.raise_for_status()
+    return resposta
+
+
+def _validadors(resposta):
+    return {"etag": resposta.headers.get("ETag"), "last_modified": resposta.headers.get("Last-Modified")}
+
+
+def _revalidar_recepta(url, anterior):
+    try:
+        resposta = _get_condicional(url, anterior or {})
+    except Exception as e:
+        print(f"⚠️ Error llegint la recepta {url}: {e}")
+        return anterior
+    if resposta is None:
+        return anterior
+    titol, cos = _parsejar_recepta(resposta.content)
+    return dict(_validadors(resposta), titol=titol, cos=cos, url=url)
+
+
+def actualitzar_cataleg():
+    # Si ja hi ha un refresc en curs (p. ex. el del planificador i un /receptes
+    # amb el catàleg buit) no se'n fa un altre: s'espera que acabi i se'n fa servir el resultat
+    if not _lock_refresc_cataleg.acquire(blocking=False):
+        with _lock_refresc_cataleg:
+            return len(_carregar_cataleg()["receptes"])
+    try:
+        return _refrescar_cataleg()
+    finally:
+        _lock_refresc_cataleg.release()
+
+
+def _refrescar_cataleg():
+    global _cataleg
+    cataleg = _carregar_cataleg()
+    nou = {"index": cataleg["index"], "enllacos": cataleg["enllacos"], "receptes": dict(cataleg["receptes"])}
+
+    resposta = _get_condicional(URL_RECEPTES, cataleg["index"])
+    if resposta is not None:
+        enllacos = _parsejar_index(resposta.content)
+        if enllacos is None:
+            raise ValueError("No s'ha trobat l'índex de receptes")
+        nou["index"] = _validadors(resposta)
+        nou["enllacos"] = enllacos
+
+    with ThreadPoolExecutor(max_workers=MAX_FILS_RECEPTES) as pool:
+        revisades = pool.map(lambda url: _revalidar_recepta(url, cataleg["receptes"].get(url)), nou["enllacos"])
+        nou["receptes"] = {url: r for url, r in zip(nou["enllacos"], revisades) if r}
+
+    if nou != cataleg:
+        _guardar_cataleg(nou)
+    with _lock_cataleg:
+        _cataleg = nou
+    _indexar_cataleg(nou)
+    return len(nou["receptes"])
+
+
+def enllacos_receptes():
+    cataleg = _carregar_cataleg()
+    if not cataleg["enllacos"]:
+        try:
+            actualitzar_cataleg()
+        except Exception as e:
+            print(f"⚠️ Error actualitzant el catàleg de receptes: {e}")
+            return None
+        cataleg = _carregar_cataleg()
+    return cataleg["enllacos"]
+
+
+def recepta(enllac_recepta):
+    recepta_guardada = _carregar_cataleg()["receptes"].get(enllac_recepta)
+    if recepta_guardada is None:
+        # Recepta nova que encara no ha passat pel refresc: la llegim directament
+        return obtenir_recepta(enllac_recepta)
+    return f"{recepta_guardada['titol']}\n\n{recepta_guardada['cos']}\n\n{enllac_recepta}"
+
+# --- CERCA DE RECEPTES ---
+# Índex invertit en memòria sobre els títols i el text de les receptes del
+# catàleg. Els termes es normalitzen sense accents (cuina -> cuina, pèsols ->
+# pesols, l·l -> ll) i només es reindexen les receptes que han canviat.
+PES_TITOL = 3
+PES_PREFIX = 0.5
+PARAULES_BUIDES = {"a", "al", "amb", "de", "del", "d", "el", "els", "en", "es", "i",
+                   "l", "la", "les", "o", "per", "que", "s", "un", "una", "y"}
+
+_index_cerca = {}      # terme -> {url: pes}
+_termes_doc = {}       # url -> {terme: pes}
+_versio_doc = {}       # url -> empremta del contingut indexat
+_vocabulari = []       # termes ordenats, per a les cerques per prefix
+_cataleg_indexat = None
+_lock_cerca = threading.Lock()
+
+
+def _normalitzar(text):
+    text = unicodedata.normalize("NFKD", text.lower().replace("·", ""))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [t for t in re.findall(r"[a-z0-9]+", text) if t not in PARAULES_BUIDES]
+
+
+def _termes_recepta(recepta_guardada):
+    termes = Counter()
+    for terme in _normalitzar(recepta_guardada["titol"]):
+        termes[terme] += PES_TITOL
+    for terme in _normalitzar(recepta_guardada["cos"]):
+        termes[terme] += 1
+    return termes
+
+
+def _treure_doc(url):
+    for terme in _termes_doc.pop(url, {}):
+        docs = _index_cerca[terme]
+        docs.pop(url, None)
+        if not docs:
+            del _index_cerca[terme]
+    _versio_doc.pop(url, None)
+
+
+def _indexar_cataleg(cataleg):
+    global _cataleg_indexat
+    with _lock_cerca:
+        receptes_cataleg = cataleg["receptes"]
+        for url in [u for u in _termes_doc if u not in receptes_cataleg]:
+            _treure_doc(url)
+        for url, recepta_guardada in receptes_cataleg.items():
+            versio = hash((recepta_guardada["titol"], recepta_guardada["cos"]))
+            if _versio_doc.get(url) == versio:
+                continue
+            _treure_doc(url)
+            termes = _termes_recepta(recepta_guardada)
+            for terme, pes in termes.items():
+                _index_cerca.setdefault(terme, {})[url] = pes
+            _termes_doc[url] = termes
+            _versio_doc[url] = versio
+        _vocabulari[:] = sorted(_index_cerca)
+        _cataleg_indexat = cataleg
+
+
+def _termes_amb_prefix(prefix):
+    inici = bisect.bisect_left(_vocabulari, prefix)
+    for terme in _vocabulari[inici:]:
+        if not terme.startswith(prefix):
+            break
+        yield terme
+
+
+def buscar_receptes(consulta, maxim=10):
+    # Retorna [(posició a l'índex, títol, url)] ordenat per rellevància
+    cataleg = _carregar_cataleg()
+    if cataleg is not _cataleg_indexat:
+        _indexar_cataleg(cataleg)
+
+    termes_consulta = _normalitzar(consulta)
+    puntuacions = Counter()
+    encerts = Counter()
+    with _lock_cerca:
+        total = max(len(_termes_doc), 1)
+        for terme in termes_consulta:
+            trobats = {}
+            # Coincidència exacta, i per prefix (amb menys pes) per a termes de 3+ lletres
+            candidats = [(terme, 1)]
+            if len(terme) >= 3:
+                candidats += [(t, PES_PREFIX) for t in _termes_amb_prefix(terme) if t != terme]
+            for candidat, factor in candidats:
+                docs = _index_cerca.get(candidat, {})
+                idf = math.log(1 + total / len(docs)) if docs else 0
+                for url, pes in docs.items():
+                    trobats[url] = max(trobats.get(url, 0), factor * pes * idf)
+            for url, punts in trobats.items():
+                puntuacions[url] += punts
+                encerts[url] += 1
+
+    # Primer les receptes que contenen més termes de la consulta
+    ordenats = sorted(puntuacions, key=lambda u: (encerts[u], puntuacions[u]), reverse=True)
+    posicions = {url: i for i, url in enumerate(cataleg["enllacos"], 1)}
+    return [(posicions.get(url), cataleg["receptes"][url]["titol"], url)
+            for url in ordenats[:maxim] if url in cataleg["receptes"]]
+
 # Funcions per per mostrar les dades dels esports.
 def leer_csv(nombre_archivo):
 
@@ -186,30 +488,426 @@ def generar_mensaje(datos):
 
     return mensaje
 
+# --- MAGATZEM INCREMENTAL OHLCV ---
+# Un fitxer binari per (ticker, interval) amb registres de mida fixa que només
+# creix pel final. Només s'hi guarden espelmes tancades; l'espelma en curs es
+# retorna però no es persisteix. Es llegeix amb np.memmap.
+DIR_OHLCV = "dades_ohlcv"
+COLUMNES_OHLCV = ["Open", "High", "Low", "Close", "Volume"]
+DTYPE_OHLCV = np.dtype([("ts", "<i8")] + [(c, "<f8") for c in COLUMNES_OHLCV])
+DURADA_INTERVAL = {
+    "1m": timedelta(minutes=1), "2m": timedelta(minutes=2), "5m": timedelta(minutes=5),
+    "15m": timedelta(minutes=15), "30m": timedelta(minutes=30),
+    "60m": timedelta(hours=1), "1h": timedelta(hours=1),
+    "1d": timedelta(days=1), "1wk": timedelta(weeks=1),
+}
+DIES_PER_PERIODE = {"5d": 5, "1wk": 7, "1mo": 31, "3mo": 92, "6mo": 183, "1y": 366, "2y": 731}
+
+_locks_ohlcv = {}
+_lock_locks_ohlcv = threading.Lock()
+
+
+def _lock_fitxer_ohlcv(path):
+    with _lock_locks_ohlcv:
+        return _locks_ohlcv.setdefault(path, threading.Lock())
+
+
+def _fitxer_ohlcv(ticker, interval):
+    nom = re.sub(r"[^A-Za-z0-9_.-]", "_", ticker)
+    return os.path.join(DIR_OHLCV, f"{nom}_{interval}.bin")
+
+
+def _llegir_ohlcv(path):
+    if not os.path.exists(path) or os.path.getsize(path) < DTYPE_OHLCV.itemsize:
+        return np.empty(0, dtype=DTYPE_OHLCV)
+    # Si l'última escriptura va quedar a mitges, ignorem el registre incomplet
+    n = os.path.getsize(path) // DTYPE_OHLCV.itemsize
+    return np.array(np.memmap(path, dtype=DTYPE_OHLCV, mode="r", shape=(n,)))
+
+
+def _a_registres(df):
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+    registres = np.empty(len(df), dtype=DTYPE_OHLCV)
+    registres["ts"] = index.asi8
+    for col in COLUMNES_OHLCV:
+        registres[col] = df[col].to_numpy(dtype="f8") if col in df else np.nan
+    return registres
+
+
+def _a_dataframe(registres):
+    index = pd.DatetimeIndex(registres["ts"].astype("datetime64[ns]"), name="Date")
+    return pd.DataFrame({c: registres[c] for c in COLUMNES_OHLCV}, index=index)
+
+
+def _descarregar_des_de(ticker, inici, interval):
+    df = yf.download(ticker, start=inici.strftime('%Y-%m-%d'), interval=interval, progress=False)
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+    return df.dropna(how="all")
+
+
+def dades_ohlcv(ticker, dies, interval="1d"):
+    # Retorna les espelmes dels darrers `dies` dies baixant només les noves.
+    # Sense connexió, serveix el que hi hagi al disc.
+    path = _fitxer_ohlcv(ticker, interval)
+    durada = pd.Timedelta(DURADA_INTERVAL[interval]).value
+    ara = pd.Timestamp.now(tz="UTC").tz_localize(None)
+    inici = ara - timedelta(days=dies)
+    oberta = np.empty(0, dtype=DTYPE_OHLCV)
+
+    with _lock_fitxer_ohlcv(path):
+        guardat = _llegir_ohlcv(path)
+        # Si el magatzem no cobreix l'inici de la finestra el tornem a omplir sencer
+        reescriure = not len(guardat) or guardat["ts"][0] > (inici + timedelta(days=5)).value
+        desde = inici if reescriure else pd.Timestamp(int(guardat["ts"][-1]) + durada)
+
+        try:
+            nous = _a_registres(_descarregar_des_de(ticker, desde, interval))
+        except Exception as e:
+            print(f"⚠️ Sense dades noves per {ticker}, fem servir el magatzem local: {e}")
+            nous = None
+
+        if nous is not None and len(nous):
+            tancades = nous[nous["ts"] + durada <= ara.value]
+            oberta = nous[nous["ts"] + durada > ara.value]
+            if not reescriure:
+                tancades = tancades[tancades["ts"] > guardat["ts"][-1]]
+            os.makedirs(DIR_OHLCV, exist_ok=True)
+            with open(path, "wb" if reescriure else "ab") as f:
+                f.write(tancades.tobytes())
+            guardat = _llegir_ohlcv(path)
+
+    tot = np.concatenate([guardat, oberta])
+    finestra = tot[tot["ts"] >= inici.value]
+    if not len(finestra):
+        raise ValueError(f"No hi ha dades per {ticker} ({dies} dies, {interval})")
+    return _a_dataframe(finestra)
+
+
+# --- CAPA DE DADES DE MERCAT ---
+# Cache compartida per veles, pnf i obtenir_dades. Cada entrada és un DataFrame
+# OHLCV per (ticker, periode, interval) amb un TTL que depèn de l'interval.
+TTL_PER_INTERVAL = {
+    "1m": 30, "2m": 60, "5m": 120, "15m": 300, "30m": 600,
+    "60m": 900, "90m": 900, "1h": 900,
+    "1d": 900, "5d": 3600, "1wk": 3600, "1mo": 6 * 3600, "3mo": 6 * 3600,
+}
+TTL_PER_DEFECTE = 900
+MEMORIA_MAX_MERCAT = 64 * 1024 * 1024  # 64 MB de DataFrames com a màxim
+MAX_FILS_MERCAT = 8  # fils per a les baixades individuals de reserva
+
+_cache_mercat = OrderedDict()  # clau -> (caduca, mida_bytes, df)
+_descarregues_en_curs = {}     # clau -> Future (evita baixades duplicades)
+_memoria_mercat = 0
+_lock_mercat = threading.Lock()
+_comptadors_mercat = Counter()  # hits, misses, coalescits (esperen una baixada en curs), evictions
+
+
+def _descarregar_mercat(ticker, periode, interval):
+    # Els gràfics passen pel magatzem local i només baixen les espelmes noves
+    if interval in DURADA_INTERVAL and periode in DIES_PER_PERIODE:
+        return dades_ohlcv(ticker, DIES_PER_PERIODE[periode], interval)
+
+    df = yf.download(ticker, period=periode, interval=interval, progress=False)
+
+    # Si el DataFrame té MultiIndex a les columnes, ens quedem amb la primera capa
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+
+    if df.empty:
+        raise ValueError(f"No hi ha dades per {ticker} ({periode}, {interval})")
+    return df
+
+
+def _guardar_mercat(clau, df):
+    global _memoria_mercat
+    mida = int(df.memory_usage(deep=True).sum())
+    caduca = time.monotonic() + TTL_PER_INTERVAL.get(clau[2], TTL_PER_DEFECTE)
+
+    anterior = _cache_mercat.pop(clau, None)
+    if anterior:
+        _memoria_mercat -= anterior[1]
+    _cache_mercat[clau] = (caduca, mida, df)
+    _memoria_mercat += mida
+
+    # Expulsem les entrades menys usades fins a tornar al pressupost de memòria
+    while _memoria_mercat > MEMORIA_MAX_MERCAT and len(_cache_mercat) > 1:
+        _, (_, mida_vella, _) = _cache_mercat.popitem(last=False)
+        _memoria_mercat -= mida_vella
+        _comptadors_mercat["evictions"] += 1
+
+
+def _reclamar_mercat(clau):
+    # Retorna ("hit", df), ("espera", futur) si un altre fil ja el baixa,
+    # o ("propi", futur) si ens toca baixar-lo a nosaltres. Cal tenir el lock.
+    global _memoria_mercat
+    entrada = _cache_mercat.get(clau)
+    if entrada and entrada[0] > time.monotonic():
+        _cache_mercat.move_to_end(clau)
+        _comptadors_mercat["hits"] += 1
+        return "hit", entrada[2].copy()
+    if entrada:
+        # Entrada caducada: la traiem i la tractem com un miss
+        del _cache_mercat[clau]
+        _memoria_mercat -= entrada[1]
+
+    futur = _descarregues_en_curs.get(clau)
+    if futur is not None:
+        # No és un miss: no provoca cap baixada, s'afegeix a la que ja hi ha
+        _comptadors_mercat["coalescits"] += 1
+        return "espera", futur
+    _comptadors_mercat["misses"] += 1
+    futur = Future()
+    _descarregues_en_curs[clau] = futur
+    return "propi", futur
+
+
+def _resoldre_mercat(clau, futur, df=None, error=None):
+    with _lock_mercat:
+        if error is None:
+            _guardar_mercat(clau, df)
+        del _descarregues_en_curs[clau]
+    if error is None:
+        futur.set_result(df)
+    else:
+        futur.set_exception(error)
+
+
+def dades_mercat(ticker, periode, interval="1d"):
+    clau = (ticker, periode, interval)
+    with _lock_mercat:
+        estat, valor = _reclamar_mercat(clau)
+
+    if estat == "hit":
+        return valor
+    # Si algú altre ja està baixant la mateixa clau, esperem el seu resultat
+    if estat == "espera":
+        return valor.result().copy()
+
+    try:
+        df = _descarregar_mercat(ticker, periode, interval)
+    except Exception as e:
+        _resoldre_mercat(clau, valor, error=e)
+        raise
+    _resoldre_mercat(clau, valor, df)
+    return df.copy()
+
+
+def _descarregar_mercat_lot(tickers, periode, interval):
+    # Una sola baixada per a tots els tickers; retorna només els que tenen dades
+    df = yf.download(tickers, period=periode, interval=interval, group_by="ticker",
+                     progress=False, threads=True)
+    frames = {}
+    for ticker in tickers:
+        if isinstance(df.columns, pd.MultiIndex):
+            if ticker not in df.columns.get_level_values(0):
+                continue
+            sub = df[ticker]
+        else:
+            sub = df
+        sub = sub.dropna(how="all")
+        if not sub.empty:
+            frames[ticker] = sub
+    return frames
+
+
+def _intentar_descarregar(ticker, periode, interval):
+    try:
+        return _descarregar_mercat(ticker, periode, interval), None
+    except Exception as e:
+        return None, e
+
+
+def dades_mercat_multiples(tickers, periode, interval="1d"):
+    # Com dades_mercat però per a molts tickers: els que no són a la cache es
+    # baixen d'un sol cop, i els que fallen en bloc es reintenten en paral·lel.
+    # Retorna {ticker: df} només amb els tickers que s'han pogut obtenir.
+    resultats, propis, aliens = {}, {}, {}
+    with _lock_mercat:
+        for ticker in dict.fromkeys(tickers):
+            estat, valor = _reclamar_mercat((ticker, periode, interval))
+            if estat == "hit":
+                resultats[ticker] = valor
+            elif estat == "espera":
+                aliens[ticker] = valor
+            else:
+                propis[ticker] = valor
+
+    if propis:
+        try:
+            frames = _descarregar_mercat_lot(list(propis), periode, interval)
+        except Exception as e:
+            print(f"⚠️ Error en la baixada en bloc: {e}")
+            frames = {}
+
+        fallits = [t for t in propis if t not in frames]
+        errors = {}
+        if fallits:
+            with ThreadPoolExecutor(max_workers=min(MAX_FILS_MERCAT, len(fallits))) as pool:
+                intents = pool.map(lambda t: _intentar_descarregar(t, periode, interval), fallits)
+                for ticker, (df, error) in zip(fallits, intents):
+                    if df is not None:
+                        frames[ticker] = df
+                    else:
+                        errors[ticker] = error
+
+        for ticker, futur in propis.items():
+            clau = (ticker, periode, interval)
+            if ticker in frames:
+                _resoldre_mercat(clau, futur, frames[ticker])
+                resultats[ticker] = frames[ticker].copy()
+            else:
+                _resoldre_mercat(clau, futur, error=errors[ticker])
+
+    for ticker, futur in aliens.items():
+        try:
+            resultats[ticker] = futur.result().copy()
+        except Exception:
+            pass
+
+    return resultats
+
+
+def estadistiques_mercat():
+    with _lock_mercat:
+        return {
+            "hits": _comptadors_mercat["hits"],
+            "misses": _comptadors_mercat["misses"],
+            "coalescits": _comptadors_mercat["coalescits"],
+            "evictions": _comptadors_mercat["evictions"],
+            "entrades": len(_cache_mercat),
+            "bytes": _memoria_mercat,
+        }
+
+
 def obtenir_dades(tickers):
-    # Crear un diccionario para almacenar los precios de cierre y la variación
-    closing_prices = {}
-    var_prices = {}
+    # Baixem tots els tickers d'un sol cop (els que falten a la cache)
+    frames = dades_mercat_multiples(tickers, '1wk')
     result=[]
 
-    # Obtener el precio de cierre y la variación para cada ticker
-    for ticker in tickers:
-        data = yf.Ticker(ticker).history(period='1wk')  # Obtener los datos del último día
-        closing_price = data['Close'].iloc[-1]  # Extraer el precio de cierre
-        closing_prices[ticker] = closing_price
-        data['Variació_preu_%'] = data['Close'].pct_change() * 100
-        var = data['Variació_preu_%'].iloc[-1]
-        var_prices[ticker] = var
+    if frames:
+        # Taula de tancaments: una columna per ticker
+        closes = pd.concat({t: df['Close'] for t, df in frames.items()}, axis=1)
+
+        # Darrer tancament i el tancament anterior de cada columna, sense bucles
+        valids = closes.notna()
+        posicio = valids.cumsum()
+        n_valids = valids.sum()
+        closing_prices = closes.ffill().iloc[-1]
+        anteriors = closes.where(valids & posicio.eq(n_valids - 1)).max()
+        var_prices = (closing_prices / anteriors - 1) * 100
     
     for ticker in tickers:
-        price = closing_prices[ticker]
-        var = var_prices[ticker]
+        if ticker not in frames:
+            result.append(f"{ticker}:  sense dades")
+            continue
+        price = float(closing_prices[ticker])
+        var = float(var_prices[ticker])
         if price < 10:
             result.append(f"{ticker}:  ${round(price, 3)}   {round(var, 2)}%") 
         else:
             result.append(f"{ticker}:  ${round(price)}   {round(var, 2)}%") 
     return "\n".join(result)
 
+# --- CACHE DE GRÀFICS RENDERITZATS ---
+# Els PNG es guarden per (ticker, tipus, paràmetres, empremta de les dades), de
+# manera que si les espelmes no han canviat no cal tornar a cridar mpf.plot.
+# L'empremta només cobreix les espelmes tancades i el preu arrodonit del títol:
+# l'espelma en curs canvia a cada baixada i, si hi entrés, cap gràfic (ni els
+# preescalfats) es tornaria a servir.
+MEMORIA_MAX_GRAFICS = 32 * 1024 * 1024  # 32 MB de PNG com a màxim
+PARS_PER_DEFECTE = ['BTC-USD', 'BNB-USD', 'ETH-USD']
+
+_cache_grafics = OrderedDict()  # clau -> bytes del PNG
+_memoria_grafics = 0
+_lock_grafics = threading.Lock()
+_comptadors_grafics = Counter()  # hits, misses, evictions
+
+
+# Pyplot té estat global: serialitzem els mpf.plot dins del procés
+_lock_render = threading.Lock()
+# Si es defineix (p. ex. un ProcessPoolExecutor), els mpf.plot s'hi executen
+EXECUTOR_RENDER = None
+# Si es defineix, cada gràfic servit també s'escriu en aquest directori (depuració)
+DIR_GRAFICS_DEBUG = os.getenv("GRAFICS_DEBUG_DIR")
+
+
+def _sortida_grafic(png, par, tipus):
+    # Cada petició rep el seu propi buffer, llest per a send_photo
+    if DIR_GRAFICS_DEBUG:
+        os.makedirs(DIR_GRAFICS_DEBUG, exist_ok=True)
+        with open(os.path.join(DIR_GRAFICS_DEBUG, f"{par}_{tipus}.png"), 'wb') as f:
+            f.write(png)
+    sortida = io.BytesIO(png)
+    sortida.name = f"{par}_{tipus}.png"
+    return sortida
+
+
+def _renderitzar(dades, **kwargs):
+    buffer = io.BytesIO()
+    mpf.plot(dades, savefig=dict(fname=buffer, format='png'), **kwargs)
+    return buffer.getvalue()
+
+
+def renderitzar_grafic(dades, **kwargs):
+    if EXECUTOR_RENDER is not None:
+        return EXECUTOR_RENDER.submit(_renderitzar, dades, **kwargs).result()
+    with _lock_render:
+        return _renderitzar(dades, **kwargs)
+
+
+def empremta_dades(df, preu_titol, interval="1d"):
+    ara = pd.Timestamp.now(tz="UTC").tz_localize(None)
+    tancades = df[df.index + DURADA_INTERVAL[interval] <= ara]
+    resum = hashlib.sha1(pd.util.hash_pandas_object(tancades, index=True).values.tobytes())
+    resum.update(str(preu_titol).encode())
+    return resum.hexdigest()
+
+
+def _grafic_en_cache(clau):
+    with _lock_grafics:
+        png = _cache_grafics.get(clau)
+        if png is None:
+            _comptadors_grafics["misses"] += 1
+            return None
+        _cache_grafics.move_to_end(clau)
+        _comptadors_grafics["hits"] += 1
+        return png
+
+
+def _guardar_grafic(clau, png):
+    global _memoria_grafics
+    with _lock_grafics:
+        anterior = _cache_grafics.pop(clau, None)
+        if anterior is not None:
+            _memoria_grafics -= len(anterior)
+        _cache_grafics[clau] = png
+        _memoria_grafics += len(png)
+        while _memoria_grafics > MEMORIA_MAX_GRAFICS and len(_cache_grafics) > 1:
+            _, vell = _cache_grafics.popitem(last=False)
+            _memoria_grafics -= len(vell)
+            _comptadors_grafics["evictions"] += 1
+
+
+def estadistiques_grafics():
+    with _lock_grafics:
+        return dict(_comptadors_grafics, entrades=len(_cache_grafics), bytes=_memoria_grafics)
+
+
+def preescalfar_grafics(pars=PARS_PER_DEFECTE):
+    # Pensat per cridar-se just després del tancament diari: deixa a la cache
+    # les gràfiques per defecte amb les espelmes del dia tancat, que es serveixen
+    # mentre el preu arrodonit del títol no canviï.
+    for par in pars:
+        for funcio in (veles, pnf):
+            try:
+                funcio(par)
+            except Exception as e:
+                print(f"⚠️ Error preparant {funcio.__name__} {par}: {e}")
+
+
 def veles(par):
     # Definir el periode de temps respecte avui, en dies
     dies_enrera = 90
@@ -220,14 +918,11 @@ def veles(par):
     # Definir la fecha final como la fecha actual
     final = datetime.now().strftime('%Y-%m-%d')
 
-    # Descarrega les dades del BTC
-    btc_data = yf.download(par, period='3mo')
+    # Descarrega les dades del BTC (via la cache de mercat, ja amb columnes planes)
+    btc_data = dades_mercat(par, '3mo')
 
     # print(btc_data.head())
 
-    # Si el DataFrame té MultiIndex a les columnes
-    btc_data.columns = btc_data.columns.get_level_values(0)  # agafa només la primera capa
-
     # Sortida: Open, High, Low, Close, Volume, Price (ja plana)
     # print(btc_data.head())
 
@@ -237,7 +932,11 @@ def veles(par):
 
     # import mplfinance as mpf
 
-    imagen_path = 'grafica.png'
+    preu_titol = round(darrer_preu_tancament)
+    clau = (par, 'veles', None, empremta_dades(btc_data, preu_titol))
+    png = _grafic_en_cache(clau)
+    if png is not None:
+        return _sortida_grafic(png, par, 'veles')
 
     hlines = dict(
         hlines=[darrer_preu_tancament],   # només els valors
@@ -247,24 +946,20 @@ def veles(par):
         alpha=0.5
     )
 
-    mpf.plot(
+    png = renderitzar_grafic(
         btc_data,
         type='candle',
         hlines=hlines,
         volume=True,
         style='charles',
-        title=f'{par} ({round(darrer_preu_tancament)})',
-        savefig=imagen_path
+        title=f'{par} ({preu_titol})',
     )
 
-    return imagen_path
+    _guardar_grafic(clau, png)
+    return _sortida_grafic(png, par, 'veles')
 
 def pnf(par):
-    btc_data = yf.download(par, period='6mo', interval='1d').dropna()
-
-    # Si hi ha MultiIndex a les columnes, aplanem
-    if isinstance(btc_data.columns, pd.MultiIndex):
-        btc_data.columns = btc_data.columns.droplevel(1)
+    btc_data = dades_mercat(par, '6mo', '1d').dropna()
 
     darrer_preu_tancament = float(btc_data['Close'].iloc[-1])
 
@@ -283,41 +978,191 @@ def pnf(par):
     box = calcular_tamany_caixa(darrer_preu_tancament)
     revers = 3
 
-    imagen_path = 'grafica.png'
+    preu_titol = round(darrer_preu_tancament)
+    clau = (par, 'pnf', (box, revers), empremta_dades(btc_data, preu_titol))
+    png = _grafic_en_cache(clau)
+    if png is not None:
+        return _sortida_grafic(png, par, 'pnf')
+
     hlines = dict(hlines=[darrer_preu_tancament],
                   colors=['b'],
                   linestyle='--',
                   linewidths=1)
 
-    mpf.plot(
+    png = renderitzar_grafic(
         btc_data,
         type='pnf',
         pnf_params=dict(box_size=box, reversal=revers),
         hlines=hlines,
         volume=True,
         style='charles',
-        title=f'P&F {par} - Box/Rev ({box}/{revers}) - Preu({round(darrer_preu_tancament)})',
+        title=f'P&F {par} - Box/Rev ({box}/{revers}) - Preu({preu_titol})',
         ylabel='Preu (USD)',
-        savefig=imagen_path,
         # figratio=(6,4),   # amplada:altura
         # figscale=1.5      # es 
     )
 
-    return imagen_path
+    _guardar_grafic(clau, png)
+    return _sortida_grafic(png, par, 'pnf')
 
 
-def transit():
-    # Configuració del navegador
+# --- POOL DE NAVEGADORS HEADLESS ---
+# Sessions de Chrome ja arrencades que es reutilitzen entre feines. Cada una
+# té el seu perfil temporal, que s'esborra quan el navegador es tanca.
+MAX_NAVEGADORS = int(os.getenv("MAX_NAVEGADORS", 2))
+MAX_USOS_NAVEGADOR = 50  # reciclem la sessió després de tantes feines
+MEMORIA_MAX_NAVEGADOR = 1024 * 1024 * 1024  # RSS màxim de tots els processos de Chrome abans de reciclar
+ESPERA_NAVEGADOR = 60  # segons d'espera màxima per una sessió lliure
+
+_navegadors_lliures = queue.LifoQueue()
+_navegadors_oberts = {}  # id(driver) -> {"driver", "perfil", "usos"}
+_navegadors_obrint = 0   # llocs reservats per sessions que s'estan arrencant
+_lock_navegadors = threading.Lock()
+_ruta_driver = None
+
+
+def _ruta_chromedriver():
+    # ChromeDriverManager només es consulta un cop per procés
+    global _ruta_driver
+    with _lock_navegadors:
+        if _ruta_driver is None:
+            _ruta_driver = ChromeDriverManager().install()
+        return _ruta_driver
+
+
+def _reservar_lloc(maxim=MAX_NAVEGADORS):
+    # Reserva un lloc al pool sota el lock: dos fils no poden passar el límit
+    # obrint alhora. Qui el reserva ha de cridar _obrir_navegador().
+    global _navegadors_obrint
+    with _lock_navegadors:
+        if len(_navegadors_oberts) + _navegadors_obrint >= maxim:
+            return False
+        _navegadors_obrint += 1
+        return True
+
+
+def _obrir_navegador():
+    global _navegadors_obrint
+    perfil = tempfile.mkdtemp(prefix="chrome_pool_")
     options = Options()
+    options.add_argument("--headless=new")
     options.add_argument("--no-sandbox")
     options.add_argument("--disable-dev-shm-usage")
-    # options.add_argument("--headless") 
-    # options.add_argument("--disable-gpu")
-    options.add_argument("--start-maximized")
-    # options.add_argument("--incognito")  # 🔹 Navegador sense cookies
-    options.add_argument(f"--user-data-dir={tempfile.mkdtemp()}")  # 🔹 Perfil temporal
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+    options.add_argument("--disable-gpu")
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument(f"--user-data-dir={perfil}")  # 🔹 Perfil temporal
+    try:
+        driver = webdriver.Chrome(service=Service(_ruta_chromedriver()), options=options)
+    except Exception:
+        with _lock_navegadors:
+            _navegadors_obrint -= 1
+        shutil.rmtree(perfil, ignore_errors=True)
+        raise
+    entrada = {"driver": driver, "perfil": perfil, "usos": 0}
+    with _lock_navegadors:
+        _navegadors_obrint -= 1
+        _navegadors_oberts[id(driver)] = entrada
+    return entrada
+
+
+def _tancar_navegador(entrada):
+    with _lock_navegadors:
+        _navegadors_oberts.pop(id(entrada["driver"]), None)
+    try:
+        entrada["driver"].quit()
+    except Exception:
+        pass
+    shutil.rmtree(entrada["perfil"], ignore_errors=True)
+
+
+def _memoria_navegador(driver):
+    # RSS de tots els processos de Chrome que pengen del chromedriver
+    # (navegador, renderers, GPU...). El heap JS de la pestanya no serveix:
+    # entre feines la pestanya és about:blank.
+    memoria = 0
+    for proces in psutil.Process(driver.service.process.pid).children(recursive=True):
+        try:
+            memoria += proces.memory_info().rss
+        except psutil.NoSuchProcess:
+            pass
+    return memoria
+
+
+def _navegador_sa(entrada):
+    if entrada["usos"] >= MAX_USOS_NAVEGADOR:
+        return False
+    try:
+        entrada["driver"].current_url  # la sessió encara respon
+        return _memoria_navegador(entrada["driver"]) < MEMORIA_MAX_NAVEGADOR
+    except Exception:
+        return False
+
+
+def _agafar_navegador():
+    limit = time.monotonic() + ESPERA_NAVEGADOR
+    while True:
+        try:
+            entrada = _navegadors_lliures.get_nowait()
+        except queue.Empty:
+            if _reservar_lloc():
+                return _obrir_navegador()
+            restant = limit - time.monotonic()
+            if restant <= 0:
+                raise TimeoutError("No hi ha cap navegador lliure")
+            try:
+                entrada = _navegadors_lliures.get(timeout=min(restant, 1))
+            except queue.Empty:
+                continue
+
+        if _navegador_sa(entrada):
+            return entrada
+        _tancar_navegador(entrada)
+
+
+def _retornar_navegador(entrada):
+    # Deixem la sessió neta per a la següent feina
+    driver = entrada["driver"]
+    entrada["usos"] += 1
+    try:
+        for finestra in driver.window_handles[1:]:
+            driver.switch_to.window(finestra)
+            driver.close()
+        driver.switch_to.window(driver.window_handles[0])
+        driver.switch_to.default_content()
+        driver.delete_all_cookies()
+        driver.get("about:blank")
+    except Exception:
+        _tancar_navegador(entrada)
+        return
+    _navegadors_lliures.put(entrada)
+
+
+@contextmanager
+def navegador():
+    entrada = _agafar_navegador()
     try:
+        yield entrada["driver"]
+    finally:
+        _retornar_navegador(entrada)
+
+
+def preescalfar_navegadors(n=1):
+    # Arrenca sessions per endavant perquè la primera feina no pagui l'arrencada
+    while _reservar_lloc(min(n, MAX_NAVEGADORS)):
+        _navegadors_lliures.put(_obrir_navegador())
+
+
+@atexit.register
+def tancar_navegadors():
+    with _lock_navegadors:
+        entrades = list(_navegadors_oberts.values())
+    for entrada in entrades:
+        _tancar_navegador(entrada)
+
+
+def transit():
+    # Fem servir una sessió del pool de navegadors headless
+    with navegador() as driver:
         driver.get("https://cit.transit.gencat.cat/cit/AppJava/views/incidents.xhtml")
 
         # 🔹 Esborrem cookies un cop carregada la web
@@ -379,60 +1224,157 @@ def transit():
         # Enviem tot el missatge a Telegram
         # envia_missatge(missatge)
 
-    finally:
-        driver.quit()
-        
     return missatge
 
-def diesel():
-    urls = [
-        "https://preciocombustible.es/barcelona/vilanova-del-valles/14361-esclatoil",
-        "https://preciocombustible.es/barcelona/montornes-del-valles/2786-nuroil",
-        "https://preciocombustible.es/barcelona/montmelo/12468-ballenoil",
-        "https://preciocombustible.es/barcelona/parets-del-valles/14716-bonarea",
-        "https://preciocombustible.es/barcelona/cabrera-de-mar/12728-esclatoil",
-        "https://preciocombustible.es/barcelona/mataro/14113-gm-oil",
-        "https://preciocombustible.es/barcelona/mataro/15825-petroprix",
-        "https://preciocombustible.es/barcelona/ripollet/14552-petroprix",
-    
-    ]
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0 Safari/537.36"
+def temperatura():
+    with navegador() as driver:
+        driver.get("https://nauticmasnou.com/meteo/")
+
+        # Acceptar cookies si cal
+        try:
+            boto_cookies = WebDriverWait(driver, 5).until(
+                EC.element_to_be_clickable((By.CSS_SELECTOR, "#wt-cli-accept-all-btn"))
+            )
+            boto_cookies.click()
+        except:
+            pass
+
+        # Entrar a l'iframe [1] (Weatherlink)
+        iframes = driver.find_elements(By.TAG_NAME, "iframe")
+        driver.switch_to.frame(iframes[1])
+
+        # Temperatura actual
+        temperatura_elem = WebDriverWait(driver, 15).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "div.col-8.no-padding"))
+        )
+        temperatura_valor = float(re.sub(r"[^\d,]", "", temperatura_elem.text.strip()).replace(",", "."))
+
+        # Màx i mín
+        hi_lo_elem = WebDriverWait(driver, 15).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "div.temp-hi-lo"))
+        )
+        spans = hi_lo_elem.find_elements(By.TAG_NAME, "span")
+
+        high_valor = float(re.sub(r"[^\d,]", "", spans[0].text.strip()).replace(",", "."))
+        high_time = spans[1].text.strip()
+
+        low_valor = float(re.sub(r"[^\d,]", "", spans[2].text.strip()).replace(",", "."))
+        low_time = spans[3].text.strip()
+
+    # Missatge formatat
+    return (
+        f"Meteo Masnou\n"
+        f"Actual: {temperatura_valor} °C\n"
+        f"Màx: {high_valor} °C {high_time}\n"
+        f"Mín: {low_valor} °C {low_time}"
+    )
+
+# --- PREUS DIESEL ---
+# Llista d'estacions per defecte. Si existeix FITXER_ESTACIONS_DIESEL (una URL
+# per línia) la substitueix, així es poden afegir estacions sense tocar codi.
+URLS_DIESEL = [
+    "https://preciocombustible.es/barcelona/vilanova-del-valles/14361-esclatoil",
+    "https://preciocombustible.es/barcelona/montornes-del-valles/2786-nuroil",
+    "https://preciocombustible.es/barcelona/montmelo/12468-ballenoil",
+    "https://preciocombustible.es/barcelona/parets-del-valles/14716-bonarea",
+    "https://preciocombustible.es/barcelona/cabrera-de-mar/12728-esclatoil",
+    "https://preciocombustible.es/barcelona/mataro/14113-gm-oil",
+    "https://preciocombustible.es/barcelona/mataro/15825-petroprix",
+    "https://preciocombustible.es/barcelona/ripollet/14552-petroprix",
+]
+FITXER_ESTACIONS_DIESEL = "estacions_diesel.txt"
+TTL_DIESEL = int(os.getenv("TTL_DIESEL", 3 * 3600))  # els preus canvien poques vegades al dia
+MAX_FILS_DIESEL = 16
+
+_cache_diesel = {}  # url -> (moment, dades de l'estació)
+_lock_diesel = threading.Lock()
+
+
+def estacions_diesel():
+    if os.path.exists(FITXER_ESTACIONS_DIESEL):
+        with open(FITXER_ESTACIONS_DIESEL, encoding='utf-8') as f:
+            urls = [l.strip() for l in f if l.strip() and not l.startswith('#')]
+        if urls:
+            return urls
+    return URLS_DIESEL
+
+
+def _parsejar_estacio(html):
+    soup = BeautifulSoup(html, "html.parser")
+
+    preu = soup.find("span", itemprop="price")
+    gasolinera = soup.select_one("ul li.uk-text-large.uk-text-bold.uk-text-center")
+    ciutat = soup.select_one("ul li:nth-child(4)")
+    return {
+        "gasolinera": gasolinera.get_text(strip=True) if gasolinera else 'No trobat',
+        "preu_text": preu.get_text(strip=True) if preu else 'No trobat',
+        "preu": float(preu.text.replace(",", ".")),
+        "ciutat": ciutat.get_text(strip=True) if ciutat else 'No trobat',
     }
 
+
+def _estacio_diesel(url, refrescar=False):
+    # Retorna (dades, moment) o (None, None) si mai s'ha pogut llegir l'estació.
+    # Amb refrescar=True es torna a llegir encara que la cache sigui vigent.
+    with _lock_diesel:
+        guardat = _cache_diesel.get(url)
+    if guardat and not refrescar and time.time() - guardat[0] < TTL_DIESEL:
+        return guardat[1], guardat[0]
+
+    try:
+        resposta = _sessio_http().get(url, timeout=TIMEOUT_HTTP)
+        resposta.raise_for_status()
+        dades = _parsejar_estacio(resposta.text)
+    except Exception as e:
+        # Si falla, tirem de l'últim valor conegut encara que sigui vell
+        print(f"⚠️ Error llegint {url}: {e}")
+        return (guardat[1], guardat[0]) if guardat else (None, None)
+
+    moment = time.time()
+    with _lock_diesel:
+        _cache_diesel[url] = (moment, dades)
+    return dades, moment
+
+
+def diesel(refrescar=False):
+    # El refresc periòdic del bot passa refrescar=True: la instantània ha de ser
+    # tan nova com diu la seva edat, no una còpia de la cache d'estacions
+    urls = estacions_diesel()
+
     missatge = "Preus Diesel:\n"
 
-    for url in urls:
-        
-        resposta = requests.get(url, headers=headers)
+    with ThreadPoolExecutor(max_workers=min(MAX_FILS_DIESEL, len(urls))) as pool:
+        resultats = list(pool.map(lambda url: _estacio_diesel(url, refrescar), urls))
 
-        soup = BeautifulSoup(resposta.text, "html.parser")
+    for url, (dades, moment) in zip(urls, resultats):
+        if dades is None:
+            missatge += f"""
+            {url.rsplit('/', 1)[-1]}: sense dades
+            """
+            continue
 
-        preu = soup.find("span", itemprop="price")
-        gasolinera = soup.select_one("ul li.uk-text-large.uk-text-bold.uk-text-center")
-        actualitzacio = soup.select_one(r"body > div > main > div > div > div.uk-grid.uk-child-width-1-2\@m.uk-grid-match.uk-grid-stack > div:nth-child(1) > div > ul > li:nth-child(2)")
-        ciutat = soup.select_one("ul li:nth-child(4)")
-        preu_float = float(preu.text.replace(",", "."))
+        preu_float = dades["preu"]
         diposit = round(preu_float*35,1)
         dipositEO1 = round((preu_float-0.05)*35,1)
         dipositEO2 = round((preu_float-0.07)*35,1)
+        antiguitat = time.time() - moment
+        nota = f" (fa {antiguitat / 3600:.1f} h)" if antiguitat > TTL_DIESEL else ""
 
-        if gasolinera.text == "Esclatoil":
+        if dades["gasolinera"] == "Esclatoil":
             missatge += f"""
-            Gasolinera: {gasolinera.get_text(strip=True) if gasolinera else 'No trobat'}
-            Preu: {preu.get_text(strip=True) if preu else 'No trobat'}
-            {ciutat.get_text(strip=True) if ciutat else 'No trobat'}
+            Gasolinera: {dades["gasolinera"]}
+            Preu: {dades["preu_text"]}{nota}
+            {dades["ciutat"]}
             Dipòsit: {diposit}€
             Dipòsit client: {dipositEO1}€ mati {dipositEO2}€
             """
         else:
             missatge += f"""
-            Gasolinera: {gasolinera.get_text(strip=True) if gasolinera else 'No trobat'}
-            Preu: {preu.get_text(strip=True) if preu else 'No trobat'}
-            {ciutat.get_text(strip=True) if ciutat else 'No trobat'}
+            Gasolinera: {dades["gasolinera"]}
+            Preu: {dades["preu_text"]}{nota}
+            {dades["ciutat"]}
             Dipòsit: {diposit}€
             """
 
     return(missatge)
 
-    
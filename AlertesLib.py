@@ -0,0 +1,259 @@
+import os
+import json
+import time
+import queue
+import threading
+import pandas as pd
+import yfinance as yf
+from datetime import datetime, timedelta, timezone
+
+# --- MOTOR D'ALERTES DE PREU ---
+# Cada regla vigila un parell amb un llindar d'entrada (avisa quan el preu hi
+# arriba o el supera) i/o un de sortida (avisa quan el preu hi baixa). Cada
+# costat de la regla té el seu estat:
+#   - histèresi: després d'avisar, no es torna a armar fins que el preu no
+#     s'allunya del llindar una fracció `histeresi` (evita avisos en ràfega
+#     quan el preu balla al voltant del llindar)
+#   - cooldown: temps mínim entre dos avisos del mateix costat
+# Les regles i el seu estat es guarden a FITXER_REGLES i sobreviuen reinicis.
+# A cada tick es demanen tots els parells d'una sola baixada.
+FITXER_REGLES = "regles_alertes.json"
+HISTERESI_PER_DEFECTE = 0.01
+COOLDOWN_PER_DEFECTE = 4 * 3600
+MINUTS_COTITZACIO = 15   # finestra de barres d'1 minut per trobar l'últim preu
+
+_regles = None
+_per_parell = None       # parell -> regles, per avaluar un tick sense recórrer-les totes
+_versio_regles = 0       # canvia cada cop que s'afegeix o es treu una regla
+_lock_regles = threading.Lock()
+
+
+def _carregar():
+    global _regles
+    if _regles is None:
+        try:
+            with open(FITXER_REGLES, encoding="utf-8") as f:
+                _regles = json.load(f)
+        except (OSError, ValueError):
+            _regles = []
+    return _regles
+
+
+def _regles_canviades():
+    global _per_parell, _versio_regles
+    _per_parell = None
+    _versio_regles += 1
+
+
+def _regles_de(parell):
+    global _per_parell
+    if _per_parell is None:
+        _per_parell = {}
+        for regla in _carregar():
+            _per_parell.setdefault(regla["parell"], []).append(regla)
+    return _per_parell.get(parell, ())
+
+
+def _guardar():
+    temporal = FITXER_REGLES + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(_regles, f, indent=1)
+    os.replace(temporal, FITXER_REGLES)
+
+
+def regles():
+    with _lock_regles:
+        return [dict(r) for r in _carregar()]
+
+
+def afegir_regla(parell, entrada=None, sortida=None, histeresi=HISTERESI_PER_DEFECTE, cooldown=COOLDOWN_PER_DEFECTE):
+    # Retorna l'id de la nova regla
+    if entrada is None and sortida is None:
+        raise ValueError("Cal un llindar d'entrada o de sortida")
+    with _lock_regles:
+        regles_actuals = _carregar()
+        nou_id = max((r["id"] for r in regles_actuals), default=0) + 1
+        regles_actuals.append({
+            "id": nou_id,
+            "parell": parell.upper(),
+            "entrada": entrada,
+            "sortida": sortida,
+            "histeresi": histeresi,
+            "cooldown": cooldown,
+            # estat de cada costat: armat i moment de l'últim avís
+            "armat_entrada": True,
+            "armat_sortida": True,
+            "ultim_entrada": 0,
+            "ultim_sortida": 0,
+        })
+        _regles_canviades()
+        _guardar()
+        return nou_id
+
+
+def treure_regla(id_regla):
+    with _lock_regles:
+        regles_actuals = _carregar()
+        restants = [r for r in regles_actuals if r["id"] != id_regla]
+        if len(restants) == len(regles_actuals):
+            return False
+        regles_actuals[:] = restants
+        _regles_canviades()
+        _guardar()
+        return True
+
+
+def cotitzacions(parells):
+    # Últim preu de tots els parells en una sola baixada de poques barres d'1 minut.
+    # Retorna {parell: preu} només amb els que tenen dades.
+    parells = sorted(set(parells))
+    if not parells:
+        return {}
+    inici = datetime.now(timezone.utc) - timedelta(minutes=MINUTS_COTITZACIO)
+    df = yf.download(parells, start=inici, interval="1m", group_by="ticker", progress=False, threads=True)
+    if df is None or df.empty:
+        return {}
+    if isinstance(df.columns, pd.MultiIndex):
+        tancaments = df.xs("Close", axis=1, level=1)
+    else:
+        tancaments = df[["Close"]].set_axis(parells, axis=1)
+    ultims = tancaments.ffill().iloc[-1].dropna()
+    return {parell: float(preu) for parell, preu in ultims.items()}
+
+
+def _avaluar_costat(regla, costat, preu, ara):
+    llindar = regla[costat]
+    if llindar is None:
+        return False
+    if costat == "entrada":
+        creuat = preu >= llindar
+        rearmat = preu < llindar * (1 - regla["histeresi"])
+    else:
+        creuat = preu <= llindar
+        rearmat = preu > llindar * (1 + regla["histeresi"])
+
+    armat = f"armat_{costat}"
+    if not regla[armat]:
+        if rearmat:
+            regla[armat] = True
+        return False
+    if creuat and ara - regla[f"ultim_{costat}"] >= regla["cooldown"]:
+        regla[armat] = False
+        regla[f"ultim_{costat}"] = ara
+        return True
+    return False
+
+
+def avaluar(preus, ara=None):
+    # Aplica els preus a totes les regles i retorna els avisos [(regla, costat, preu)].
+    # L'estat modificat es desa un sol cop per tick.
+    ara = ara or time.time()
+    avisos = []
+    canviat = False
+    with _lock_regles:
+        for parell, preu in preus.items():
+            for regla in _regles_de(parell):
+                abans = (regla["armat_entrada"], regla["armat_sortida"])
+                for costat in ("entrada", "sortida"):
+                    if _avaluar_costat(regla, costat, preu, ara):
+                        avisos.append((dict(regla), costat, preu))
+                canviat |= abans != (regla["armat_entrada"], regla["armat_sortida"])
+        if canviat:
+            _guardar()
+    return avisos
+
+
+def text_avis(regla, costat, preu):
+    return f"{regla['parell']} preu {costat} {preu:.3f} (llindar {regla[costat]})"
+
+
+def tick(enviar):
+    # Una iteració completa: cotitzacions en bloc, avaluació i enviament.
+    # Retorna els preus obtinguts.
+    preus = cotitzacions(r["parell"] for r in regles())
+    for regla, costat, preu in avaluar(preus):
+        enviar(text_avis(regla, costat, preu))
+    return preus
+
+
+# --- MODE STREAMING ---
+# En lloc de consultar cada 15 minuts, una subscripció persistent empeny cada
+# preu a l'avaluador tan bon punt arriba. El transport és intercanviable: és
+# una funció transport(parells) que genera (parell, preu) i s'acaba quan el
+# flux es talla.
+#   transport_yahoo:           WebSocket de Yahoo Finance (via yfinance)
+#   transport_replay(fitxer):  reprodueix un fitxer de ticks, per a proves
+# Els fitxers de replay tenen un tick per línia en JSON, amb el mateix format
+# que els missatges del WebSocket: {"id": "DOGE-USD", "price": 0.251, "time": "..."}
+ESPERA_RECONNEXIO = (1, 60)   # backoff exponencial entre reconnexions (mínim, màxim)
+MIDA_CUA_TICKS = 10000
+
+
+def transport_yahoo(parells):
+    cua = queue.Queue(maxsize=MIDA_CUA_TICKS)
+    ws = yf.WebSocket(verbose=False)
+    ws.subscribe(parells)
+
+    def escoltar_ws():
+        # listen() retorna quan la connexió cau
+        try:
+            ws.listen(cua.put)
+        finally:
+            cua.put(None)
+
+    threading.Thread(target=escoltar_ws, name="websocket-preus", daemon=True).start()
+    try:
+        while True:
+            missatge = cua.get()
+            if missatge is None:
+                return
+            if "id" in missatge and "price" in missatge:
+                yield missatge["id"], float(missatge["price"])
+    finally:
+        ws.close()
+
+
+def transport_replay(fitxer, interval=0):
+    # interval: segons d'espera entre ticks (0 = tan ràpid com es pugui)
+    def transport(parells):
+        parells = set(parells)
+        with open(fitxer, encoding="utf-8") as f:
+            for linia in f:
+                if not linia.strip():
+                    continue
+                missatge = json.loads(linia)
+                if missatge["id"] in parells:
+                    yield missatge["id"], float(missatge["price"])
+                    if interval:
+                        time.sleep(interval)
+    return transport
+
+
+def escoltar(enviar, transport=transport_yahoo, en_tick=None, aturar=None, reconnectar=True):
+    # Avalua les regles a cada tick del transport. Si el flux es talla (o canvien
+    # els parells vigilats) es torna a subscriure, amb backoff si falla seguit.
+    aturar = aturar or threading.Event()
+    espera = ESPERA_RECONNEXIO[0]
+    while not aturar.is_set():
+        with _lock_regles:
+            versio = _versio_regles
+        parells = sorted({r["parell"] for r in regles()})
+        ticks = 0
+        try:
+            for parell, preu in transport(parells):
+                ticks += 1
+                for regla, costat, p in avaluar({parell: preu}):
+                    enviar(text_avis(regla, costat, p))
+                if en_tick:
+                    en_tick(parell, preu)
+                if aturar.is_set() or _versio_regles != versio:
+                    break
+        except Exception as e:
+            print(f"⚠️ Error al flux de preus: {e}")
+        if not reconnectar:
+            return
+        if _versio_regles != versio:
+            continue
+        # Si la connexió ha donat ticks, tornem a començar des de l'espera mínima
+        espera = ESPERA_RECONNEXIO[0] if ticks else min(espera * 2, ESPERA_RECONNEXIO[1])
+        aturar.wait(espera)
@@ -1,7 +1,12 @@
 from telegram import Update
-from telegram.ext import Updater, CommandHandler, CallbackContext
+from telegram.ext import Application, CommandHandler, CallbackContext
 import ATLib as at
+import BotLib as bl
+import LecturesLib as ll
+import SubscripcionsLib as sl
 import os
+import datetime
+from zoneinfo import ZoneInfo
 from dotenv import load_dotenv #Importem la funció per carregar .env
 
 load_dotenv() 
@@ -15,129 +20,283 @@ PORT = int(os.environ.get('PORT', 8080))
 # Aquesta variable l'hauràs de crear a l'entorn de Render amb el domini del teu servei.
 WEBHOOK_URL = os.environ.get('WEBHOOK_URL')
 
+TICKERS_PREUS = ['BTC-USD', 'BNB-USD', 'ETH-USD', 'DOGE-USD', 'SOL-USD']
+
 # Función del comandos
-def veles(update: Update, context: CallbackContext) -> None:
-    update.message.reply_text("Per veure les grafiques en veles disponibles, /Veles_BTC, /Veles_BNB, /Veles_ETH")
+async def veles(update: Update, context: CallbackContext) -> None:
+    await update.message.reply_text("Per veure les grafiques en veles disponibles, /Veles_BTC, /Veles_BNB, /Veles_ETH")
 
-def pnf(update: Update, context: CallbackContext) -> None:
-    update.message.reply_text("Per veure les grafiques Punt i Figura disponibles,/PnF_BTC, /PnF_BNB, /PnF_ETH ")
+async def pnf(update: Update, context: CallbackContext) -> None:
+    await update.message.reply_text("Per veure les grafiques Punt i Figura disponibles,/PnF_BTC, /PnF_BNB, /PnF_ETH ")
 
-def veles_btc(update,context):
-    imagen_path = at.veles('BTC-USD')
-    context.bot.send_photo(chat_id=update.effective_chat.id, photo=open(imagen_path, 'rb'))
+@bl.en_segon_pla("cpu")
+async def veles_btc(update,context):
+    grafic = await bl.executar("cpu", at.veles, 'BTC-USD')
+    await context.bot.send_photo(chat_id=update.effective_chat.id, photo=grafic)
 
-def pnf_btc(update,context):
-    imagen_path = at.pnf('BTC-USD')
-    context.bot.send_photo(chat_id=update.effective_chat.id, photo=open(imagen_path, 'rb'))
+@bl.en_segon_pla("cpu")
+async def pnf_btc(update,context):
+    grafic = await bl.executar("cpu", at.pnf, 'BTC-USD')
+    await context.bot.send_photo(chat_id=update.effective_chat.id, photo=grafic)
 
-def veles_bnb(update,context):
-    imagen_path = at.veles('BNB-USD')
-    context.bot.send_photo(chat_id=update.effective_chat.id, photo=open(imagen_path, 'rb'))
+@bl.en_segon_pla("cpu")
+async def veles_bnb(update,context):
+    grafic = await bl.executar("cpu", at.veles, 'BNB-USD')
+    await context.bot.send_photo(chat_id=update.effective_chat.id, photo=grafic)
 
-def pnf_bnb(update,context):
-    imagen_path = at.pnf('BNB-USD')
-    context.bot.send_photo(chat_id=update.effective_chat.id, photo=open(imagen_path, 'rb'))
+@bl.en_segon_pla("cpu")
+async def pnf_bnb(update,context):
+    grafic = await bl.executar("cpu", at.pnf, 'BNB-USD')
+    await context.bot.send_photo(chat_id=update.effective_chat.id, photo=grafic)
 
-def veles_eth(update,context):
-    imagen_path = at.veles('ETH-USD')
-    context.bot.send_photo(chat_id=update.effective_chat.id, photo=open(imagen_path, 'rb'))
+@bl.en_segon_pla("cpu")
+async def veles_eth(update,context):
+    grafic = await bl.executar("cpu", at.veles, 'ETH-USD')
+    await context.bot.send_photo(chat_id=update.effective_chat.id, photo=grafic)
 
-def pnf_eth(update,context):
-    imagen_path = at.pnf('ETH-USD')
-    context.bot.send_photo(chat_id=update.effective_chat.id, photo=open(imagen_path, 'rb'))
+@bl.en_segon_pla("cpu")
+async def pnf_eth(update,context):
+    grafic = await bl.executar("cpu", at.pnf, 'ETH-USD')
+    await context.bot.send_photo(chat_id=update.effective_chat.id, photo=grafic)
 
-def preus(update, context):
-    tickers = ['BTC-USD', 'BNB-USD', 'ETH-USD', 'DOGE-USD', 'SOL-USD']
-    message = at.obtenir_dades(tickers)
-    context.bot.send_message(chat_id=update.effective_chat.id, text=message)
+@bl.en_segon_pla("io", font="preus")
+async def preus(update, context):
+    message = await bl.executar("io", at.obtenir_dades, TICKERS_PREUS)
+    await context.bot.send_message(chat_id=update.effective_chat.id, text=message)
 
-def temperatura(update, context):
-    message = at.temperatura()
-    context.bot.send_message(chat_id=update.effective_chat.id, text=message)
+@bl.en_segon_pla("navegador")
+async def temperatura(update, context):
+    message = await bl.executar("navegador", at.temperatura)
+    await context.bot.send_message(chat_id=update.effective_chat.id, text=message)
 
-def diesel(update, context):
-    message = at.diesel()
-    context.bot.send_message(chat_id=update.effective_chat.id, text=message)
+@bl.en_segon_pla("io", font="diesel")
+async def diesel(update, context):
+    message = await bl.executar("io", at.diesel)
+    await context.bot.send_message(chat_id=update.effective_chat.id, text=message)
 
-def transit(update, context):
-    message = at.transit()
-    context.bot.send_message(chat_id=update.effective_chat.id, text=message)
+@bl.en_segon_pla("navegador", font="transit")
+async def transit(update, context):
+    message = await bl.executar("navegador", at.transit)
+    await context.bot.send_message(chat_id=update.effective_chat.id, text=message)
 
-def receptes(update: Update, context: CallbackContext) -> None:
-    enllacos = at.obtenir_enllacos_des_de_pagina_principal('https://allstendres.blogspot.com')
+# Les receptes surten del catàleg local (memòria), refrescat en segon pla
+@bl.en_segon_pla("io", avis=None)
+async def receptes(update: Update, context: CallbackContext) -> None:
+    enllacos = await bl.executar("io", at.enllacos_receptes)
     if enllacos:
         message = "Receptes disponibles:\n\n"
         for idx, enllac_recepta in enumerate(enllacos, 1):
             nom_recepta = enllac_recepta.split('/')[-1].replace('-', ' ').title()[:-5]
             message += f"{idx}. {nom_recepta}\n"
         message += "\nSelecciona una recepte utilizant /selecciona X [X = número de la recepta]."
-        update.message.reply_text(message)
+        await update.message.reply_text(message)
     else:
-        update.message.reply_text("No s'han pogut obtenir les receptes disponibles.")
+        await update.message.reply_text("No s'han pogut obtenir les receptes disponibles.")
 
-def selecciona(update: Update, context: CallbackContext) -> None:
+@bl.en_segon_pla("io", avis=None)
+async def selecciona(update: Update, context: CallbackContext) -> None:
     args = context.args
     if len(args) == 0:
-        update.message.reply_text(
+        await update.message.reply_text(
             "Usa: /selecciona X [X = número de la recepta] per seleccionar una recepta."
         )
     else:
         num_recepta = int(args[0])
-        enllacos = at.obtenir_enllacos_des_de_pagina_principal('https://allstendres.blogspot.com')
-        if 1 <= num_recepta <= len(enllacos):
+        enllacos = await bl.executar("io", at.enllacos_receptes)
+        if enllacos and 1 <= num_recepta <= len(enllacos):
             enllac_recepta = enllacos[num_recepta - 1]
-            recepta = at.obtenir_recepta(enllac_recepta)
+            recepta = await bl.executar("io", at.recepta, enllac_recepta)
             if recepta:
-                update.message.reply_text(recepta)
+                await update.message.reply_text(recepta)
         else:
-            update.message.reply_text("Selecció no vàlida.")
+            await update.message.reply_text("Selecció no vàlida.")
+
+@bl.en_segon_pla("io")
+async def generar_loteria(update, context):
+    text = await bl.executar("io", at.loteria_del_dia)
+    await update.message.reply_text(text, parse_mode="Markdown")
+
+async def loteria(update: Update, context: CallbackContext) -> None:
+    # Si la recomanació del proper sorteig ja està calculada, responem a l'instant
+    text = at.loteria_en_cache()
+    if text:
+        await update.message.reply_text(text, parse_mode="Markdown")
+    else:
+        await generar_loteria(update, context)
+
+@bl.en_segon_pla("io", avis=None)
+async def busca(update: Update, context: CallbackContext) -> None:
+    consulta = " ".join(context.args)
+    if not consulta:
+        await update.message.reply_text("Usa: /busca paraules per cercar entre les receptes.")
+        return
+    resultats = await bl.executar("io", at.buscar_receptes, consulta)
+    if not resultats:
+        await update.message.reply_text(f"No s'ha trobat cap recepta per \"{consulta}\".")
+        return
+    message = f"Receptes per \"{consulta}\":\n\n"
+    for posicio, titol, _ in resultats:
+        message += f"{posicio}. {titol}\n"
+    message += "\nSelecciona una recepta utilitzant /selecciona X."
+    await update.message.reply_text(message)
+
+async def subscriure(update: Update, context: CallbackContext) -> None:
+    disponibles = ", ".join(sl.DIGESTS)
+    if len(context.args) != 1 or context.args[0].lower() not in sl.DIGESTS:
+        await update.message.reply_text(f"Usa: /subscriure X [X = {disponibles}] per rebre el resum cada dia.")
+        return
+    digest = context.args[0].lower()
+    if sl.subscriure(update.effective_chat.id, digest):
+        await update.message.reply_text(f"✅ Subscrit a: {sl.DIGESTS[digest]}. Per donar-te de baixa, /baixa {digest}")
+    else:
+        await update.message.reply_text(f"Ja estàs subscrit a: {sl.DIGESTS[digest]}.")
+
+async def baixa(update: Update, context: CallbackContext) -> None:
+    # Sense arguments, de tots els resums
+    digest = context.args[0].lower() if context.args else None
+    if sl.donar_de_baixa(update.effective_chat.id, digest):
+        await update.message.reply_text("✅ Baixa feta.")
+    else:
+        await update.message.reply_text("No hi havia cap subscripció a donar de baixa.")
+
+async def subscripcions(update: Update, context: CallbackContext) -> None:
+    actives = sl.subscripcions_de(update.effective_chat.id)
+    message = "Les teves subscripcions:\n" + "\n".join(f"- {nom}: {sl.DIGESTS[nom]}" for nom in actives) if actives else "No tens cap subscripció."
+    message += f"\n\nResums disponibles: {', '.join(sl.DIGESTS)} (/subscriure X, /baixa X)"
+    await update.message.reply_text(message)
+
+def text_lectures_avui():
+    avui = datetime.date.today()
+    lectures = ll.lectures_dia(ll.URL_CALENDARI, avui)
+    if not lectures:
+        return None
+    return f"LECTURES D'AVUI ({avui.strftime('%d/%m/%Y')})\n\n" + "\n".join(f"• {ll.text_lectura(l)}" for l in lectures)
+
+# Resums diaris: generador, pool on es genera i hora d'enviament (hora peninsular)
+ZONA_RESUMS = ZoneInfo("Europe/Madrid")
+RESUMS = {
+    "lectures": (text_lectures_avui, "cpu", datetime.time(hour=6, minute=30)),
+    "temperatura": (at.temperatura, "navegador", datetime.time(hour=7)),
+    "diesel": (at.diesel, "io", datetime.time(hour=8)),
+    "preus": (lambda: at.obtenir_dades(TICKERS_PREUS), "io", datetime.time(hour=9)),
+}
 
-def start(update: Update, context: CallbackContext) -> None:
-    update.message.reply_text("Hola! Per veure les receptes disponibles, usa /receptes.\nUsa /preus, /veles i /PnF per veure les dades de cryptos\n /transit per veure afectacions a BCN\n I /diesel per veure els preus de Diesel\n I /temperatura per la Temperatura d'avui de Masnou")
+REINTENT_RESUM = 5 * 60    # segons abans de tornar a provar un resum amb el pool ple
+MAX_INTENTS_RESUM = 6
+
+def generar_resum(nom):
+    # Un sol càlcul per resum (o la instantània del planificador si és fresca),
+    # sigui quin sigui el nombre de subscriptors
+    text, _ = bl.instantania(nom)
+    if text is None:
+        text = RESUMS[nom][0]()
+    return text
+
+async def enviar_resum(context: CallbackContext) -> None:
+    nom, intent = context.job.data
+    if not sl.subscriptors(nom):
+        return
+    # L'enviament va al pool io perquè no ocupi el pool on s'ha generat (p. ex.
+    # l'únic navegador). Si algun pool és ple, el resum es torna a programar.
+    try:
+        text = await bl.executar(RESUMS[nom][1], generar_resum, nom)
+        if text:
+            await bl.executar("io", sl.difondre, nom, text, token=TOKEN)
+    except bl.PoolSaturat as e:
+        if intent + 1 >= MAX_INTENTS_RESUM:
+            print(f"⚠️ Resum {nom} descartat: el pool {e} segueix ple després de {MAX_INTENTS_RESUM} intents")
+            return
+        print(f"⚠️ Resum {nom}: el pool {e} és ple, ho tornem a provar d'aquí {REINTENT_RESUM // 60} min")
+        context.job_queue.run_once(enviar_resum, REINTENT_RESUM, data=(nom, intent + 1), name=f"resum_{nom}")
+
+async def preescalfar_grafics(context: CallbackContext) -> None:
+    # Després del tancament diari (00:00 UTC) deixem les gràfiques per defecte renderitzades
+    bl.enviar("cpu", at.preescalfar_grafics)
+
+async def estat(update: Update, context: CallbackContext) -> None:
+    message = "Estat del bot:\n"
+    for classe, e in bl.estadistiques_pools().items():
+        message += f"\n{classe}: {e['en_curs']} en curs, {e['en_cua']} en cua, {e['completades']} fetes, {e['errors']} errors, {e['rebutjades']} rebutjades"
+    mercat = at.estadistiques_mercat()
+    grafics = at.estadistiques_grafics()
+    message += "\n\nInstantànies:"
+    for font in ["transit", "diesel", "preus", "receptes", "loteria"]:
+        _, edat = bl.instantania(font)
+        message += f"\n{font}: {bl.text_edat(edat) if edat is not None else 'sense dades'}"
+    message += "\n\nSubscriptors: " + ", ".join(f"{nom} {n}" for nom, n in sl.recomptes().items())
+    message += f"\n\nCache mercat: {mercat['hits']} hits, {mercat['misses']} misses, {mercat['coalescits']} coalescits, {mercat['evictions']} expulsions"
+    message += f"\nCache gràfics: {grafics.get('hits', 0)} hits, {grafics.get('misses', 0)} misses, {grafics.get('evictions', 0)} expulsions"
+    await update.message.reply_text(message)
+
+async def start(update: Update, context: CallbackContext) -> None:
+    await update.message.reply_text("Hola! Per veure les receptes disponibles, usa /receptes (o /busca per cercar-ne).\nUsa /preus, /veles i /PnF per veure les dades de cryptos\n /transit per veure afectacions a BCN\n I /diesel per veure els preus de Diesel\n I /temperatura per la Temperatura d'avui de Masnou\n I /loteria per la recomanació del proper sorteig\n Amb /subscriure reps cada dia les lectures, la temperatura, el diesel o els preus")
 
 # Execucio del bot.        
 if __name__ == '__main__':
-    # Token del bot proporcionado por BotFather
-    updater = Updater(TOKEN)
-    
-    dispatcher = updater.dispatcher
+    # Token del bot proporcionado por BotFather.
+    # Els updates es processen en paral·lel: una ordre lenta no fa esperar les altres.
+    application = Application.builder().token(TOKEN).concurrent_updates(True).build()
+
+    # Pools on s'executa la feina bloquejant dels handlers, fora del bucle d'esdeveniments
+    bl.iniciar_pools()
+    # Deixem un Chrome headless arrencat per al primer /transit o /temperatura
+    bl.enviar("navegador", at.preescalfar_navegadors)
+
+    # Fonts que es refresquen en segon pla (cadència i caducitat en segons)
+    bl.registrar_font("transit", at.transit, cada=5*60, caducitat=20*60, classe="navegador")
+    bl.registrar_font("diesel", lambda: at.diesel(refrescar=True), cada=60*60, caducitat=4*60*60)
+    bl.registrar_font("preus", lambda: at.obtenir_dades(TICKERS_PREUS), cada=5*60, caducitat=15*60)
+    bl.registrar_font("receptes", at.actualitzar_cataleg, cada=6*60*60, caducitat=24*60*60)
+    # Descarrega els sorteigs nous i deixa calculada la recomanació del proper sorteig
+    bl.registrar_font("loteria", at.loteria_del_dia, cada=60*60, caducitat=48*60*60)
+    bl.iniciar_planificador()
 
     # Handlers
-    dispatcher.add_handler(CommandHandler("start", start))
-    dispatcher.add_handler(CommandHandler("Temperatura", temperatura))
-    dispatcher.add_handler(CommandHandler("Transit", transit))
-    dispatcher.add_handler(CommandHandler("receptes", receptes))
-    dispatcher.add_handler(CommandHandler("selecciona", selecciona))
-    dispatcher.add_handler(CommandHandler("Preus", preus))
-    dispatcher.add_handler(CommandHandler("veles", veles))
-    dispatcher.add_handler(CommandHandler("diesel", diesel))
-    dispatcher.add_handler(CommandHandler("PnF", pnf))
-    dispatcher.add_handler(CommandHandler("Veles_BTC", veles_btc))
-    dispatcher.add_handler(CommandHandler("PnF_BTC", pnf_btc))
-    dispatcher.add_handler(CommandHandler("Veles_BNB", veles_bnb))
-    dispatcher.add_handler(CommandHandler("PnF_BNB", pnf_bnb))
-    dispatcher.add_handler(CommandHandler("Veles_ETH", veles_eth))
-    dispatcher.add_handler(CommandHandler("PnF_ETH", pnf_eth))
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("estat", estat))
+    application.add_handler(CommandHandler("Temperatura", temperatura))
+    application.add_handler(CommandHandler("Transit", transit))
+    application.add_handler(CommandHandler("receptes", receptes))
+    application.add_handler(CommandHandler("selecciona", selecciona))
+    application.add_handler(CommandHandler("busca", busca))
+    application.add_handler(CommandHandler("loteria", loteria))
+    application.add_handler(CommandHandler("subscriure", subscriure))
+    application.add_handler(CommandHandler("baixa", baixa))
+    application.add_handler(CommandHandler("subscripcions", subscripcions))
+    application.add_handler(CommandHandler("Preus", preus))
+    application.add_handler(CommandHandler("veles", veles))
+    application.add_handler(CommandHandler("diesel", diesel))
+    application.add_handler(CommandHandler("PnF", pnf))
+    application.add_handler(CommandHandler("Veles_BTC", veles_btc))
+    application.add_handler(CommandHandler("PnF_BTC", pnf_btc))
+    application.add_handler(CommandHandler("Veles_BNB", veles_bnb))
+    application.add_handler(CommandHandler("PnF_BNB", pnf_bnb))
+    application.add_handler(CommandHandler("Veles_ETH", veles_eth))
+    application.add_handler(CommandHandler("PnF_ETH", pnf_eth))
+
+    # Tasques programades
+    application.job_queue.run_daily(preescalfar_grafics, time=datetime.time(hour=0, minute=5, tzinfo=datetime.timezone.utc))
+    for nom, (_, _, hora) in RESUMS.items():
+        application.job_queue.run_daily(enviar_resum, time=hora.replace(tzinfo=ZONA_RESUMS), data=(nom, 0), name=f"resum_{nom}")
 
 # CANVI CLAU PER A DESPLEGAMENT EN SERVIDOR WEB (Render)
 
+    # run_webhook i run_polling mantenen el procés viu fins que el servidor l'aturi
     if WEBHOOK_URL:
-        # 1. Configurar Webhook
-        updater.start_webhook(
+        # Configurar Webhook (Telegram utilitzarà aquesta URL)
+        print(f"Iniciant bot en mode Webhook a: {WEBHOOK_URL}")
+        application.run_webhook(
             listen="0.0.0.0",
             port=PORT,
             url_path=TOKEN,  # Utilitzem el token com a path secret
             webhook_url=WEBHOOK_URL + TOKEN
         )
         
-        # 2. Assegurar-nos que Telegram utilitzi aquesta URL
-        print(f"Iniciant bot en mode Webhook a: {WEBHOOK_URL}")
-        
     else:
         # Mode per defecte: Long Polling (bo per a proves locals si falla WEBHOOK_URL)
         print("Mode Long Polling (local). Per utilitzar Webhooks, defineix WEBHOOK_URL.")
-        updater.start_polling()
-    
-    # Mantenir el procés viu fins que el servidor l'aturi
-    updater.idle()
+        application.run_polling()
+
+    bl.aturar_planificador()
+    bl.aturar_pools()
 
@@ -0,0 +1,257 @@
+import asyncio
+import functools
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import ATLib as at
+
+# --- POOLS D'EXECUCIÓ PER CLASSE DE FEINA ---
+# Cada classe té el seu pool i el seu límit, perquè una feina lenta (p. ex. un
+# /transit amb Selenium) no bloquegi les ordres lleugeres com /start.
+#   io:        scraping i peticions HTTP (diesel, receptes, preus)
+#   cpu:       gràfics; el mpf.plot en si va a un pool de processos
+#   navegador: automatització amb Chrome (transit, temperatura)
+FILS_PER_CLASSE = {"io": 8, "cpu": 2, "navegador": 1}
+PROCESSOS_RENDER = 2
+# Màxim de feines pendents (en cua + en curs) per classe abans de rebutjar-ne
+LIMIT_CUA = {"io": 50, "cpu": 10, "navegador": 3}
+
+AVIS_TREBALLANT = "⏳ Hi estic treballant, un moment..."
+AVIS_SATURAT = "🚦 Ara mateix hi ha massa peticions d'aquest tipus. Torna-ho a provar d'aquí una estona."
+
+_pools = {}
+_lock_pools = threading.Lock()
+_pendents = Counter()     # classe -> feines enviades i no acabades
+_en_curs = Counter()      # classe -> feines executant-se ara mateix
+_comptadors = Counter()   # (classe, "completades" | "errors" | "rebutjades")
+
+
+def iniciar_pools():
+    # S'ha de cridar des del procés principal (a Windows els processos fills
+    # tornen a importar el mòdul principal)
+    with _lock_pools:
+        if _pools:
+            return
+        for classe, fils in FILS_PER_CLASSE.items():
+            _pools[classe] = ThreadPoolExecutor(max_workers=fils, thread_name_prefix=f"pool-{classe}")
+        _pools["render"] = ProcessPoolExecutor(max_workers=PROCESSOS_RENDER)
+        at.EXECUTOR_RENDER = _pools["render"]
+
+
+def aturar_pools():
+    # El shutdown es fa fora del lock: cada feina cancel·lada crida
+    # _feina_acabada en aquest mateix fil, i aquesta també el necessita
+    with _lock_pools:
+        pools = list(_pools.values())
+        _pools.clear()
+        at.EXECUTOR_RENDER = None
+    for pool in pools:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _executar(classe, funcio, args, kwargs):
+    with _lock_pools:
+        _en_curs[classe] += 1
+    try:
+        return funcio(*args, **kwargs)
+    finally:
+        with _lock_pools:
+            _en_curs[classe] -= 1
+
+
+def _feina_acabada(classe, futur):
+    with _lock_pools:
+        _pendents[classe] -= 1
+        if futur.cancelled():
+            return
+        if futur.exception() is not None:
+            _comptadors[(classe, "errors")] += 1
+        else:
+            _comptadors[(classe, "completades")] += 1
+    if futur.exception() is not None:
+        print(f"⚠️ Error a la feina {classe}: {futur.exception()}")
+
+
+def _reservar(classe):
+    with _lock_pools:
+        if _pendents[classe] >= LIMIT_CUA[classe]:
+            _comptadors[(classe, "rebutjades")] += 1
+            return False
+        _pendents[classe] += 1
+        return True
+
+
+def _llancar(classe, funcio, args, kwargs):
+    futur = _pools[classe].submit(_executar, classe, funcio, args, kwargs)
+    futur.add_done_callback(functools.partial(_feina_acabada, classe))
+    return futur
+
+
+def enviar(classe, funcio, *args, **kwargs):
+    # Retorna el Future, o None si la classe ja té la cua plena
+    iniciar_pools()
+    if not _reservar(classe):
+        return None
+    return _llancar(classe, funcio, args, kwargs)
+
+
+class PoolSaturat(Exception):
+    pass
+
+
+async def executar(classe, funcio, *args, **kwargs):
+    # Versió per als handlers async: la feina bloquejant (requests, yfinance,
+    # Selenium, mplfinance...) va al pool de la classe i el bucle d'esdeveniments
+    # queda lliure per atendre altres updates mentre s'espera el resultat.
+    futur = enviar(classe, funcio, *args, **kwargs)
+    if futur is None:
+        raise PoolSaturat(classe)
+    return await asyncio.wrap_future(futur)
+
+
+def _saturat(classe):
+    with _lock_pools:
+        return _pendents[classe] >= LIMIT_CUA[classe]
+
+
+def en_segon_pla(classe, avis=AVIS_TREBALLANT, font=None):
+    # Decorador per a handlers async: respon a l'instant i després executa el
+    # handler, que porta la feina lenta al pool amb `await executar(classe, ...)`.
+    # Si el handler correspon a una font refrescada en segon pla i la seva
+    # instantània encara és vàlida, es respon directament amb ella.
+    def decorador(handler):
+        @functools.wraps(handler)
+        async def embolcall(update, context):
+            if font:
+                valor, edat = instantania(font)
+                if valor is not None:
+                    await update.message.reply_text(f"{valor}\n\n🕒 Dades {text_edat(edat)}")
+                    return
+            iniciar_pools()
+            if _saturat(classe):
+                await update.message.reply_text(AVIS_SATURAT)
+                return
+            if avis:
+                await update.message.reply_text(avis)
+            try:
+                await handler(update, context)
+            except PoolSaturat:
+                await update.message.reply_text(AVIS_SATURAT)
+        return embolcall
+    return decorador
+
+
+def estadistiques_pools():
+    with _lock_pools:
+        return {
+            classe: {
+                "en_cua": _pendents[classe] - _en_curs[classe],
+                "en_curs": _en_curs[classe],
+                "completades": _comptadors[(classe, "completades")],
+                "errors": _comptadors[(classe, "errors")],
+                "rebutjades": _comptadors[(classe, "rebutjades")],
+            }
+            for classe in FILS_PER_CLASSE
+        }
+
+
+# --- REFRESC PERIÒDIC DE FONTS ---
+# Cada font lenta (transit, diesel, preus...) es refresca en segon pla amb la
+# seva cadència i el resultat es guarda com a instantània. Les ordres responen
+# des de la instantània mentre no superi la seva caducitat.
+JITTER = 0.1           # ±10% sobre la cadència, perquè les fonts no coincideixin
+BACKOFF_BASE = 30      # segons abans del primer reintent després d'un error
+ESPERA_SATURAT = 30    # si el pool de la font està ple, ho tornem a provar aviat
+
+_fonts = {}           # nom -> configuració i estat del refresc
+_instantanies = {}    # nom -> (valor, moment)
+_lock_fonts = threading.Lock()
+_aturar_planificador = threading.Event()
+_fil_planificador = None
+
+
+def registrar_font(nom, funcio, cada, caducitat, classe="io"):
+    with _lock_fonts:
+        _fonts[nom] = {
+            "funcio": funcio,
+            "cada": cada,
+            "caducitat": caducitat,
+            "classe": classe,
+            "proper": time.monotonic() + random.uniform(0, 10),
+            "errors": 0,
+            "en_curs": False,
+        }
+
+
+def _amb_jitter(segons):
+    return segons * random.uniform(1 - JITTER, 1 + JITTER)
+
+
+def _refresc_acabat(nom, futur):
+    with _lock_fonts:
+        font = _fonts[nom]
+        font["en_curs"] = False
+        if not futur.cancelled() and futur.exception() is None:
+            _instantanies[nom] = (futur.result(), time.time())
+            font["errors"] = 0
+            font["proper"] = time.monotonic() + _amb_jitter(font["cada"])
+        else:
+            # Backoff exponencial, mai més llarg que la cadència normal
+            font["errors"] += 1
+            espera = min(font["cada"], BACKOFF_BASE * 2 ** (font["errors"] - 1))
+            font["proper"] = time.monotonic() + _amb_jitter(espera)
+
+
+def _bucle_planificador():
+    while not _aturar_planificador.is_set():
+        ara = time.monotonic()
+        with _lock_fonts:
+            pendents = [nom for nom, f in _fonts.items() if not f["en_curs"] and f["proper"] <= ara]
+            for nom in pendents:
+                _fonts[nom]["en_curs"] = True
+        for nom in pendents:
+            font = _fonts[nom]
+            futur = enviar(font["classe"], font["funcio"])
+            if futur is None:
+                with _lock_fonts:
+                    font["en_curs"] = False
+                    font["proper"] = ara + ESPERA_SATURAT
+                continue
+            futur.add_done_callback(functools.partial(_refresc_acabat, nom))
+        _aturar_planificador.wait(1)
+
+
+def iniciar_planificador():
+    global _fil_planificador
+    if _fil_planificador is not None:
+        return
+    iniciar_pools()
+    _fil_planificador = threading.Thread(target=_bucle_planificador, name="planificador", daemon=True)
+    _fil_planificador.start()
+
+
+def aturar_planificador():
+    _aturar_planificador.set()
+
+
+def instantania(nom):
+    # Retorna (valor, edat en segons), o (None, None) si no n'hi ha o és massa vella
+    with _lock_fonts:
+        guardat = _instantanies.get(nom)
+        font = _fonts.get(nom)
+    if guardat is None or font is None:
+        return None, None
+    edat = time.time() - guardat[1]
+    if edat > font["caducitat"]:
+        return None, None
+    return guardat[0], edat
+
+
+def text_edat(segons):
+    if segons < 60:
+        return "ara mateix"
+    if segons < 3600:
+        return f"fa {int(segons // 60)} min"
+    return f"fa {segons / 3600:.1f} h"
@@ -0,0 +1,302 @@
+import os
+import re
+import json
+import hashlib
+import requests
+import pdfplumber
+import numpy as np
+from datetime import date, datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+
+# --- SEGMENTACIÓ DEL CALENDARI LITÚRGIC PER DIES ---
+# Extreure el text d'una pàgina amb pdfplumber és lent. En lloc de recórrer les
+# pàgines cada dia buscant el mes i el número del dia, es fa una sola passada
+# per PDF anual que extreu el text de totes les pàgines i anota on és cada dia:
+#   data -> (offset d'inici, offset final)
+# Els offsets són sobre el text de totes les pàgines concatenat. Les lectures
+# de cada tros es guarden al magatzem anual (vegeu més avall).
+URL_CALENDARI = "https://www.conferenciaepiscopal.es/wp-content/uploads/2026/01/Calendario-Liturgico-CEE-2026.pdf"
+DIR_LECTURES = "dades_lectures"
+PAGINA_INICI = 45        # abans hi ha la presentació i el calendari de l'any anterior
+MARGE_DIA = 1000         # distància mínima entre dos dies (evita confondre'ls amb versicles)
+MIDA_MAXIMA_DIA = 25000  # l'últim dia de l'any no té cap dia següent que el tanqui
+
+MESOS_ES = ["ENERO", "FEBRERO", "MARZO", "ABRIL", "MAYO", "JUNIO", "JULIO", "AGOSTO", "SEPTIEMBRE", "OCTUBRE", "NOVIEMBRE", "DICIEMBRE"]
+
+# Un dia comença amb una línia que és el seu número seguit d'un espai
+_RE_INICI_DIA = re.compile(r"^(\d{1,2})\s", re.MULTILINE)
+
+
+def _ruta(url, extensio):
+    nom = os.path.splitext(os.path.basename(url))[0]
+    return os.path.join(DIR_LECTURES, f"{nom}{extensio}")
+
+
+def _any_calendari(url):
+    m = re.search(r"(\d{4})\.pdf$", url)
+    return int(m.group(1)) if m else datetime.now().year
+
+
+def _descarregar_pdf(url):
+    response = requests.get(url, timeout=60)
+    response.raise_for_status()
+    return response.content
+
+
+def _segmentar(textos, any_cal):
+    # Recorre el text en ordre esperant sempre el dia següent del calendari, de
+    # manera que un "12 " dins d'una lectura no es pot confondre amb el dia 12.
+    inicis_pagina = []
+    posicio = 0
+    for text in textos:
+        inicis_pagina.append(posicio)
+        posicio += len(text) + 1
+    total = posicio
+
+    # Línies candidates: (offset, número, text de la pàgina en majúscules)
+    candidats = []
+    for i, text in enumerate(textos):
+        text_maj = text.upper()
+        for m in _RE_INICI_DIA.finditer(text):
+            candidats.append((inicis_pagina[i] + m.start(), int(m.group(1)), text_maj))
+
+    inicis = []  # (data, offset)
+    esperat = date(any_cal, 1, 1)
+    ultim = -MARGE_DIA
+    saltats = 0
+    k = 0
+    while esperat.year == any_cal and k < len(candidats):
+        # Un dia que no apareix no ha de fer perdre la resta: només el busquem
+        # dins de la distància que pot ocupar un dia (o uns quants si n'hi ha de saltats)
+        limit = ultim + MIDA_MAXIMA_DIA * (saltats + 1) if inicis else total
+        nom_mes = MESOS_ES[esperat.month - 1]
+        trobat = None
+        for j in range(k, len(candidats)):
+            offset, numero, text_maj = candidats[j]
+            if offset > limit:
+                break
+            if offset >= ultim + MARGE_DIA and numero == esperat.day and nom_mes in text_maj:
+                trobat = j
+                break
+        if trobat is None:
+            saltats += 1
+        else:
+            inicis.append((esperat, candidats[trobat][0]))
+            ultim = candidats[trobat][0]
+            saltats = 0
+            k = trobat + 1
+        esperat += timedelta(days=1)
+
+    dies = {}
+    for k, (dia, inici) in enumerate(inicis):
+        fi = inicis[k + 1][1] if k + 1 < len(inicis) else min(inici + MIDA_MAXIMA_DIA, total)
+        dies[dia] = (inici, fi)
+    return dies
+
+
+# --- MAGATZEM ANUAL DE LECTURES ---
+# El PDF es descarrega un sol cop per any (es verifica amb el seu sha256) i es
+# processa sencer d'una passada: l'extracció de text es reparteix per trossos
+# de pàgines en un pool de processos, es segmenta per dies i les lectures de
+# cada dia es guarden en un fitxer binari compacte:
+#   capçalera: 366 entrades (inici, mida), una per dia de l'any
+#   cos:       les lectures de cada dia en JSON UTF-8, com a [llibre, referència, tipus, prefix]
+# Consultar qualsevol dia és llegir una entrada i un tros del cos.
+PAGINES_PER_FEINA = 16
+VERSIO_MAGATZEM = 3      # canviar-la obliga a reconstruir els magatzems existents
+DTYPE_ENTRADA = np.dtype([("inici", "<u4"), ("mida", "<u4")])
+DIES_ANY = 366
+
+SIGLES = ["Gen", "Ex", "Lev", "Num", "Dt", "Jos", "Jue", "Rut", "1 Sam", "2 Sam",
+          "1 Re", "2 Re", "1 Cron", "2 Cron", "Esd", "Neh", "Tob", "Jdt", "Est",
+          "1 Mac", "2 Mac", "Job", "Sal", "Prov", "Ecl", "Eclo", "Sab", "Is", "Jer",
+          "Lam", "Bar", "Ez", "Dan", "Os", "Jl", "Am", "Abd", "Jon", "Miq", "Nah",
+          "Hab", "Sof", "Ag", "Zac", "Mal", "Mt", "Mc", "Lc", "Jn", "Hch", "Rom",
+          "1 Cor", "2 Cor", "Gal", "Ef", "Flp", "Col", "1 Tes", "2 Tes", "1 Tim",
+          "2 Tim", "Tit", "Flm", "Heb", "Sant", "1 Pe", "2 Pe", "1 Jn", "2 Jn",
+          "3 Jn", "Jds", "Ap"]
+
+
+EVANGELIS = {"Mt", "Mc", "Lc", "Jn"}
+
+# Una sola alternança compilada en lloc de provar cada sigla amb dos startswith
+# (el llibre es reconeix també darrere d'un guió o d'un ordinal "1.ª", que es
+# guarden com a prefix perquè formen part de com es mostra la lectura)
+_RE_SIGLA = re.compile(r"^(- |\d\.\ª\s*)?(" + "|".join(re.escape(s) for s in sorted(SIGLES, key=len, reverse=True)) + r") (.*)")
+_RE_ORDINAL = re.compile(r"^\d\.\ª")
+_RE_ESPAIS = re.compile(r"\s+")
+
+
+def _linies(text):
+    # Línies del text una a una, sense crear la llista sencera
+    inici = 0
+    while inici < len(text):
+        fi = text.find("\n", inici)
+        if fi == -1:
+            fi = len(text)
+        yield text[inici:fi].strip()
+        inici = fi + 1
+
+
+def _tipus(llibre, linia):
+    if llibre == "Sal":
+        return "salm"
+    if llibre in EVANGELIS:
+        return "evangeli"
+    if linia.startswith("Secuencia"):
+        return "sequencia"
+    return "lectura" if llibre else "altre"
+
+
+def extreure_lectures(text):
+    # Genera (llibre, referència, tipus, prefix) per a cada línia de lectura del text.
+    # El prefix és el guió o l'ordinal ("- ", "1.ª ") que precedeix la sigla.
+    # Una línia és lectura si comença per sigla, guió, format "1.ª" o "Secuencia".
+    for l in _linies(text):
+        if len(l) <= 8:
+            continue
+        m = _RE_SIGLA.match(l)
+        if not (m or l.startswith("-") or _RE_ORDINAL.match(l) or l.startswith("Secuencia")):
+            continue
+        if "CALENDARIO" in l.upper():
+            continue
+        if m:
+            prefix = _RE_ESPAIS.sub(" ", m.group(1) or "")
+            llibre, referencia = m.group(2), _RE_ESPAIS.sub(" ", m.group(3)).strip()
+        else:
+            prefix, llibre, referencia = "", None, _RE_ESPAIS.sub(" ", l)
+        yield llibre, referencia, _tipus(llibre, l), prefix
+
+
+def text_lectura(lectura):
+    llibre, referencia, _, prefix = lectura
+    return f"{prefix}{llibre} {referencia}" if llibre else referencia
+
+
+def _llegir_meta(url):
+    try:
+        with open(_ruta(url, ".json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _guardar_meta(url, meta):
+    path = _ruta(url, ".json")
+    temporal = path + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(temporal, path)
+
+
+def _sha256_fitxer(path):
+    resum = hashlib.sha256()
+    with open(path, "rb") as f:
+        for tros in iter(lambda: f.read(1 << 20), b""):
+            resum.update(tros)
+    return resum.hexdigest()
+
+
+def _pdf_local(url):
+    # Retorna la ruta del PDF, descarregant-lo només si falta o no quadra el checksum
+    path = _ruta(url, ".pdf")
+    meta = _llegir_meta(url)
+    if os.path.exists(path) and meta.get("sha256") and _sha256_fitxer(path) == meta["sha256"]:
+        return path
+    contingut = _descarregar_pdf(url)
+    os.makedirs(DIR_LECTURES, exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        f.write(contingut)
+    os.replace(path + ".tmp", path)
+    meta.update(sha256=hashlib.sha256(contingut).hexdigest(), descarregat=datetime.now().isoformat())
+    _guardar_meta(url, meta)
+    return path
+
+
+def _extreure_tros(args):
+    path, inici, fi = args
+    with pdfplumber.open(path) as pdf:
+        return [pdf.pages[i].extract_text() or "" for i in range(inici, fi)]
+
+
+def extreure_pagines(path, processos=None):
+    # Text de totes les pàgines des de PAGINA_INICI, extret en paral·lel
+    with pdfplumber.open(path) as pdf:
+        n = len(pdf.pages)
+    trossos = [(path, i, min(i + PAGINES_PER_FEINA, n)) for i in range(PAGINA_INICI, n, PAGINES_PER_FEINA)]
+    with ProcessPoolExecutor(max_workers=processos) as pool:
+        return [text for tros in pool.map(_extreure_tros, trossos) for text in tros]
+
+
+def _guardar_magatzem(path, lectures_per_dia):
+    taula = np.zeros(DIES_ANY, dtype=DTYPE_ENTRADA)
+    cos = bytearray()
+    for dia, lectures in lectures_per_dia.items():
+        dades = json.dumps(lectures, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        taula[dia.timetuple().tm_yday - 1] = (taula.nbytes + len(cos), len(dades))
+        cos += dades
+    with open(path + ".tmp", "wb") as f:
+        f.write(taula.tobytes())
+        f.write(cos)
+    os.replace(path + ".tmp", path)
+
+
+def _llegir_entrada(f, dia, any_cal):
+    # Lectures d'un dia a partir del magatzem obert, o None si no hi són
+    if dia.year != any_cal:
+        return None
+    f.seek((dia.timetuple().tm_yday - 1) * DTYPE_ENTRADA.itemsize)
+    inici, mida = np.frombuffer(f.read(DTYPE_ENTRADA.itemsize), dtype=DTYPE_ENTRADA)[0]
+    if mida == 0:
+        return None
+    f.seek(int(inici))
+    return [tuple(l) for l in json.loads(f.read(int(mida)).decode("utf-8"))]
+
+
+def indexar_calendari(url, processos=None):
+    # Passada única per PDF: descàrrega, extracció paral·lela, segmentació i magatzem
+    path_pdf = _pdf_local(url)
+    textos = extreure_pagines(path_pdf, processos)
+    dies = _segmentar(textos, _any_calendari(url))
+    text = "\n".join(textos) + "\n"
+
+    lectures_per_dia = {dia: list(extreure_lectures(text[inici:fi])) for dia, (inici, fi) in dies.items()}
+    _guardar_magatzem(_ruta(url, ".lectures.bin"), lectures_per_dia)
+
+    meta = _llegir_meta(url)
+    meta.update(magatzem=meta.get("sha256"), versio=VERSIO_MAGATZEM)
+    _guardar_meta(url, meta)
+    print(f"📑 Calendari indexat: {len(dies)} dies en {len(textos)} pàgines.")
+    return lectures_per_dia
+
+
+def preparar_calendari(url, processos=None):
+    # Només fa feina el primer cop de l'any (o si el magatzem no és del PDF actual)
+    meta = _llegir_meta(url)
+    if meta.get("magatzem") and meta["magatzem"] == meta.get("sha256") and meta.get("versio") == VERSIO_MAGATZEM \
+            and os.path.exists(_ruta(url, ".lectures.bin")):
+        return False
+    indexar_calendari(url, processos)
+    return True
+
+
+def lectures_dia(url, dia):
+    # Llista de (llibre, referència, tipus, prefix) del dia, o None si el calendari no el té
+    preparar_calendari(url)
+    with open(_ruta(url, ".lectures.bin"), "rb") as f:
+        return _llegir_entrada(f, dia, _any_calendari(url))
+
+
+def lectures_interval(url, inici, fi):
+    # Genera (dia, lectures) per a cada dia de l'interval [inici, fi], a mesura
+    # que es llegeixen: només hi ha un dia en memòria i es pot anar enviant
+    # cada missatge sense esperar la resta. Si cal, el calendari es processa
+    # sencer d'una sola passada abans del primer dia.
+    preparar_calendari(url)
+    any_cal = _any_calendari(url)
+    with open(_ruta(url, ".lectures.bin"), "rb") as f:
+        dia = inici
+        while dia <= fi:
+            yield dia, _llegir_entrada(f, dia, any_cal)
+            dia += timedelta(days=1)
+
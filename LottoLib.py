@@ -0,0 +1,438 @@
+import os
+import io
+import math
+import json
+import hashlib
+import requests
+import numpy as np
+import pandas as pd
+from bs4 import BeautifulSoup
+from datetime import datetime, timedelta
+from itertools import combinations, product
+from concurrent.futures import ProcessPoolExecutor
+
+# --- MOTOR D'ESTADÍSTIQUES DE LOTERIA ---
+# Els sorteigs es guarden com un vector de dates (datetime64[D]) i una matriu
+# uint8 de 6 columnes amb els números ordenats. Tots els recomptes es fan amb
+# operacions vectoritzades de NumPy, sense bucles per fila.
+
+PARAMS_PER_DEFECTE = {
+    "dies_moment": 30,        # finestra de "moment" (números calents)
+    "dies_biaix": 90,         # finestra d'històric i de triplets
+    "llindar_moment": 0.15,   # fracció de sorteigs que ha de superar un número
+    "punts_moment": 45,
+    "punts_hist": 0.7,        # per cada aparició a la finestra d'històric
+    "punts_triplet": 12,      # per cada triplet del top on surt el número
+    "top_triplets": 50,
+}
+
+# Posicions de les 20 combinacions de 3 números dins d'un sorteig de 6
+COMBINACIONS_3 = np.array(list(combinations(range(6), 3)), dtype=np.intp)
+
+
+def llegir_csv(fitxer):
+    df = pd.read_csv(fitxer, header=0, usecols=range(7), dtype=str, encoding='utf-8', on_bad_lines='skip')
+
+    # Les dates poden venir com a dd/mm/aaaa o aaaa-mm-dd (amb hora o sense)
+    textos = df.iloc[:, 0].str.split(' ').str[0].str.replace('-', '/', regex=False)
+    dates = pd.to_datetime(textos, format="%d/%m/%Y", errors="coerce")
+    dates = dates.fillna(pd.to_datetime(textos, format="%Y/%m/%d", errors="coerce"))
+
+    nums = df.iloc[:, 1:7].apply(pd.to_numeric, errors="coerce")
+    valides = dates.notna() & nums.notna().all(axis=1) & nums.ge(1).all(axis=1) & nums.le(49).all(axis=1)
+
+    dies = dates[valides].to_numpy(dtype="datetime64[D]")
+    matriu = np.sort(nums[valides].to_numpy(dtype=np.uint8), axis=1)
+    return dies, matriu
+
+
+def carregar_sorteigs(fitxers):
+    parts = [llegir_csv(f) for f in fitxers if os.path.exists(f)]
+    if not parts:
+        return np.empty(0, dtype="datetime64[D]"), np.empty((0, 6), dtype=np.uint8)
+    dies = np.concatenate([p[0] for p in parts])
+    nums = np.concatenate([p[1] for p in parts])
+    ordre = np.argsort(dies, kind="stable")
+    return dies[ordre], nums[ordre]
+
+
+# --- ÍNDEX DENS DE TRIPLETS ---
+# Cada triplet a < b < c (1..49) té un rang fix dins de les C(49,3) = 18424
+# combinacions (sistema combinatori: C(a-1,1) + C(b-1,2) + C(c-1,3)), de
+# manera que els recomptes són un sol vector d'enters en lloc d'un Counter
+# de tuples. TRIPLETS fa la funció inversa (rang -> números).
+N_TRIPLETS = math.comb(49, 3)
+_BINOM = np.array([[math.comb(n, k) for k in range(4)] for n in range(49)], dtype=np.intp)
+
+
+def rangs(a, b, c):
+    return _BINOM[a - 1, 1] + _BINOM[b - 1, 2] + _BINOM[c - 1, 3]
+
+
+def rang_triplet(a, b, c):
+    return int(rangs(np.intp(a), np.intp(b), np.intp(c)))
+
+
+def _taula_triplets():
+    totes = np.array(list(combinations(range(1, 50), 3)), dtype=np.intp)
+    taula = np.empty((N_TRIPLETS, 3), dtype=np.uint8)
+    taula[rangs(totes[:, 0], totes[:, 1], totes[:, 2])] = totes
+    return taula
+
+
+TRIPLETS = _taula_triplets()
+
+
+def triplet(rang):
+    return tuple(int(n) for n in TRIPLETS[rang])
+
+
+def rangs_sorteigs(nums):
+    # Rangs dels 20 triplets de cada sorteig (els números ja estan ordenats)
+    t = nums[:, COMBINACIONS_3].astype(np.intp)
+    return rangs(t[..., 0], t[..., 1], t[..., 2]).ravel()
+
+
+class Finestra:
+    # Recomptes d'una finestra lliscant de sorteigs: es poden afegir els que
+    # hi entren i treure els que en surten sense recalcular res.
+    def __init__(self, amb_triplets=True):
+        self.sorteigs = 0
+        self.freq = np.zeros(50, dtype=np.int64)
+        self.triplets = np.zeros(N_TRIPLETS, dtype=np.int64) if amb_triplets else None
+        # Ordre de l'última aparició de cada triplet, per desempatar per recència
+        self.ultima = np.full(N_TRIPLETS, -1, dtype=np.int64) if amb_triplets else None
+        self._seq = 0
+
+    def _aplicar(self, nums, signe):
+        nums = np.asarray(nums, dtype=np.uint8).reshape(-1, 6)
+        self.sorteigs += signe * len(nums)
+        self.freq += signe * np.bincount(nums.ravel(), minlength=50)
+        if self.triplets is not None:
+            rangs_nous = rangs_sorteigs(nums)
+            self.triplets += signe * np.bincount(rangs_nous, minlength=N_TRIPLETS)
+            if signe > 0:
+                # Els sorteigs han d'entrar en ordre cronològic
+                seq = np.repeat(np.arange(self._seq, self._seq + len(nums)), len(COMBINACIONS_3))
+                np.maximum.at(self.ultima, rangs_nous, seq)
+                self._seq += len(nums)
+
+    def afegir(self, nums):
+        self._aplicar(nums, 1)
+
+    def treure(self, nums):
+        self._aplicar(nums, -1)
+
+    def top_triplets(self, k):
+        # Rangs dels k triplets més freqüents; en cas d'empat, el més recent.
+        # Només s'ordenen els candidats que arriben al k-èsim recompte.
+        presents = np.flatnonzero(self.triplets)
+        if len(presents) > k:
+            llindar = np.partition(self.triplets[presents], len(presents) - k)[len(presents) - k]
+            presents = presents[self.triplets[presents] >= llindar]
+        ordre = np.lexsort((-self.ultima[presents], -self.triplets[presents]))
+        return presents[ordre[:k]]
+
+    def membres_top(self, k):
+        # Quants triplets del top contenen cada número (índex 0 sense ús)
+        return np.bincount(TRIPLETS[self.top_triplets(k)].ravel(), minlength=50)
+
+
+def puntuar(freq_mom, sort_mom, freq_hist, membres_triplet, params):
+    punts = np.where(freq_mom > sort_mom * params["llindar_moment"], params["punts_moment"], 0.0)
+    punts = punts + freq_hist * params["punts_hist"]
+    punts = punts + membres_triplet * params["punts_triplet"]
+    return punts
+
+
+def puntuar_finestres(moment, biaix, params):
+    return puntuar(moment.freq, moment.sorteigs, biaix.freq, biaix.membres_top(params["top_triplets"]), params)
+
+
+def triar_apostes(punts):
+    # Ordenació estable: en cas d'empat guanya el número més baix
+    ordre = np.argsort(-punts[1:50], kind="stable") + 1
+    return sorted(ordre[:6].tolist()), sorted(ordre[6:12].tolist())
+
+
+def recomanacio(dies, nums, avui=None, params=None):
+    # Recomanació per al sorteig del dia `avui` (només compta la data): fa servir
+    # els sorteigs anteriors a aquell dia, amb finestres [dia - n, dia) com el backtest
+    params = {**PARAMS_PER_DEFECTE, **(params or {})}
+    dia = np.datetime64(avui or datetime.now(), "D")
+
+    dies = dies.astype("datetime64[D]")
+    abans = dies < dia
+    al_moment = abans & (dies >= dia - np.timedelta64(params["dies_moment"], "D"))
+    al_biaix = abans & (dies >= dia - np.timedelta64(params["dies_biaix"], "D"))
+
+    moment = Finestra(amb_triplets=False)
+    moment.afegir(nums[al_moment])
+    biaix = Finestra()
+    biaix.afegir(nums[al_biaix])
+    return triar_apostes(puntuar_finestres(moment, biaix, params))
+
+
+# --- MAGATZEM BINARI DE SORTEIGS ---
+# Un fitxer per joc amb registres fixos (dia, 6 números) ordenats per data, que
+# només creix pel final, i un JSON amb l'estat de l'última descàrrega. El CSV
+# només es torna a baixar si ha canviat (GET condicional i hash del contingut)
+# i només s'hi afegeixen els sorteigs posteriors a l'últim guardat.
+DIR_SORTEIGS = "dades_loteria"
+DTYPE_SORTEIG = np.dtype([("dia", "<i4"), ("nums", "u1", (6,))])  # dia = dies des de 1970
+HEADERS_LOTTO = {'User-Agent': 'Mozilla/5.0'}
+JOCS = {
+    "primitiva": {
+        "pagina": "https://www.lotoideas.com/primitiva-resultados-historicos-de-todos-los-sorteos/",
+        "gid": "gid=1",
+        "csv_antic": "Lotoideas.com - Histórico de Resultados - Primitiva - 2013 a 202X(1).csv",
+    },
+    "bonoloto": {
+        "pagina": "https://www.lotoideas.com/bonoloto-resultados-historicos-de-todos-los-sorteos/",
+        "gid": "gid=0",
+        "csv_antic": "Lotoideas.com - Histórico de Resultados - Bonoloto - 2013 a 202X(1).csv",
+    },
+}
+
+
+def _fitxers_joc(joc):
+    return os.path.join(DIR_SORTEIGS, f"{joc}.bin"), os.path.join(DIR_SORTEIGS, f"{joc}.json")
+
+
+def _llegir_meta(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _guardar_meta(path, meta):
+    temporal = path + ".tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(temporal, path)
+
+
+def llegir_joc(joc):
+    path, _ = _fitxers_joc(joc)
+    if not os.path.exists(path):
+        return np.empty(0, dtype="datetime64[D]"), np.empty((0, 6), dtype=np.uint8)
+    n = os.path.getsize(path) // DTYPE_SORTEIG.itemsize
+    registres = np.fromfile(path, dtype=DTYPE_SORTEIG, count=n)
+    return registres["dia"].astype("datetime64[D]"), registres["nums"]
+
+
+def _ultim_dia_guardat(joc):
+    # L'últim registre del fitxer és la font de veritat de fins on s'ha guardat
+    # (el JSON només té la cache HTTP): un tall entre l'escriptura del fitxer i la
+    # del JSON no pot fer tornar a afegir els mateixos sorteigs
+    path, _ = _fitxers_joc(joc)
+    if not os.path.exists(path):
+        return None
+    n = os.path.getsize(path) // DTYPE_SORTEIG.itemsize
+    if not n:
+        return None
+    with open(path, "rb") as f:
+        f.seek((n - 1) * DTYPE_SORTEIG.itemsize)
+        return int(np.frombuffer(f.read(DTYPE_SORTEIG.itemsize), dtype=DTYPE_SORTEIG)[0]["dia"])
+
+
+def _afegir_sorteigs(joc, dies, nums, ultim_dia):
+    # Retorna el nou últim dia guardat
+    nous = dies.astype(np.int64) > ultim_dia if ultim_dia is not None else np.ones(len(dies), bool)
+    if not nous.any():
+        return ultim_dia
+    ordre = np.argsort(dies[nous], kind="stable")
+    registres = np.empty(int(nous.sum()), dtype=DTYPE_SORTEIG)
+    registres["dia"] = dies[nous][ordre].astype(np.int64)
+    registres["nums"] = nums[nous][ordre]
+
+    path, _ = _fitxers_joc(joc)
+    os.makedirs(DIR_SORTEIGS, exist_ok=True)
+    with open(path, "ab") as f:
+        # Si l'última escriptura va quedar a mitges, traiem el registre incomplet
+        f.truncate(f.tell() // DTYPE_SORTEIG.itemsize * DTYPE_SORTEIG.itemsize)
+        f.seek(0, os.SEEK_END)
+        f.write(registres.tobytes())
+    return int(registres["dia"][-1])
+
+
+def _enllac_csv(joc):
+    config = JOCS[joc]
+    r = requests.get(config["pagina"], headers=HEADERS_LOTTO, timeout=10)
+    r.raise_for_status()
+    soup = BeautifulSoup(r.text, 'html.parser')
+    link = next((a['href'] for a in soup.find_all('a', href=True)
+                 if "output=csv" in a['href'] and config["gid"] in a['href']), None)
+    if not link:
+        raise ValueError(f"No s'ha trobat l'enllaç CSV de {joc}")
+    return link
+
+
+def actualitzar_joc(joc):
+    # Retorna quants sorteigs nous s'han afegit
+    _, path_meta = _fitxers_joc(joc)
+    meta = _llegir_meta(path_meta)
+    ultim = _ultim_dia_guardat(joc)
+    afegits = 0
+
+    # Primera vegada: aprofitem el CSV antic si n'hi ha
+    if ultim is None and os.path.exists(JOCS[joc]["csv_antic"]):
+        dies, nums = llegir_csv(JOCS[joc]["csv_antic"])
+        ultim = _afegir_sorteigs(joc, dies, nums, None)
+        afegits += len(dies)
+
+    if not meta.get("csv_url"):
+        meta = {"csv_url": _enllac_csv(joc)}
+    meta.pop("ultim_dia", None)  # format antic: ara surt del fitxer de sorteigs
+
+    capcaleres = dict(HEADERS_LOTTO)
+    if meta.get("etag"):
+        capcaleres["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        capcaleres["If-Modified-Since"] = meta["last_modified"]
+    r = requests.get(meta["csv_url"], headers=capcaleres, timeout=30)
+    if r.status_code == 304:
+        _guardar_meta(path_meta, meta)
+        return afegits
+    if r.status_code != 200:
+        # L'enllaç pot haver canviat: el tornarem a buscar la propera vegada
+        meta.pop("csv_url", None)
+        _guardar_meta(path_meta, meta)
+        r.raise_for_status()
+
+    resum = hashlib.sha256(r.content).hexdigest()
+    if resum != meta.get("sha256"):
+        dies, nums = llegir_csv(io.BytesIO(r.content))
+        afegits += int((dies.astype(np.int64) > (ultim if ultim is not None else -1)).sum())
+        _afegir_sorteigs(joc, dies, nums, ultim)
+
+    meta.update(
+        etag=r.headers.get("ETag"),
+        last_modified=r.headers.get("Last-Modified"),
+        sha256=resum,
+    )
+    _guardar_meta(path_meta, meta)
+    return afegits
+
+
+def actualitzar_sorteigs():
+    print("🛰️ Actualitzant dades de loteria des de la web...")
+    correctes = 0
+    for joc in JOCS:
+        try:
+            afegits = actualitzar_joc(joc)
+            print(f"✅ {joc} actualitzat ({afegits} sorteigs nous).")
+            correctes += 1
+        except Exception as e:
+            print(f"⚠️ Error actualitzant {joc}: {e}")
+    if not correctes:
+        raise RuntimeError("No s'ha pogut actualitzar cap joc de loteria")
+
+
+def ultim_sorteig():
+    # Dia de l'últim sorteig guardat (de qualsevol joc), o None si no n'hi ha cap
+    dies = [_ultim_dia_guardat(joc) for joc in JOCS]
+    dies = [d for d in dies if d is not None]
+    if not dies:
+        return None
+    return (datetime(1970, 1, 1) + timedelta(days=max(dies))).date()
+
+
+def carregar_magatzem():
+    # Tots els jocs junts, en ordre cronològic
+    parts = [llegir_joc(joc) for joc in JOCS]
+    dies = np.concatenate([p[0] for p in parts])
+    nums = np.concatenate([p[1] for p in parts])
+    ordre = np.argsort(dies, kind="stable")
+    return dies[ordre], nums[ordre]
+
+
+# --- BACKTEST DE L'ESTRATÈGIA ---
+# Reprodueix l'històric: per a cada data de sorteig construeix la recomanació
+# amb els sorteigs anteriors (la mateixa que donaria recomanacio() per a aquell
+# dia) i la compara amb el resultat real. Les finestres
+# es mouen de forma incremental (entren i surten sorteigs), sense recalcular.
+GRAELLA_PER_DEFECTE = {
+    "punts_moment": [0, 25, 45, 65],
+    "punts_hist": [0.35, 0.7, 1.4],
+    "punts_triplet": [0, 6, 12, 24],
+}
+
+
+def apostes_historiques(dies, nums, params):
+    # Genera (índex del sorteig, apostes) per a cada sorteig avaluable de l'històric
+    dies = dies.astype("datetime64[D]")
+    moment = Finestra(amb_triplets=False)
+    biaix = Finestra()
+    entra = surt_mom = surt_biaix = 0
+    inici = dies[0] + np.timedelta64(params["dies_biaix"], "D") if len(dies) else None
+    dia_anterior, apostes = None, None
+
+    for i in range(len(dies)):
+        dia = dies[i]
+        if dia != dia_anterior:
+            # Entren els sorteigs anteriors a aquest dia i surten els massa vells
+            while entra < len(dies) and dies[entra] < dia:
+                moment.afegir(nums[entra])
+                biaix.afegir(nums[entra])
+                entra += 1
+            while surt_mom < entra and dies[surt_mom] < dia - np.timedelta64(params["dies_moment"], "D"):
+                moment.treure(nums[surt_mom])
+                surt_mom += 1
+            while surt_biaix < entra and dies[surt_biaix] < dia - np.timedelta64(params["dies_biaix"], "D"):
+                biaix.treure(nums[surt_biaix])
+                surt_biaix += 1
+            dia_anterior = dia
+            apostes = None
+            if dia >= inici:
+                apostes = triar_apostes(puntuar_finestres(moment, biaix, params))
+
+        if apostes is not None:
+            yield i, apostes
+
+
+def backtest(dies, nums, params=None):
+    params = {**PARAMS_PER_DEFECTE, **(params or {})}
+    encerts_a, encerts_b = [], []
+    for i, apostes in apostes_historiques(dies, nums, params):
+        encerts_a.append(int(np.isin(apostes[0], nums[i]).sum()))
+        encerts_b.append(int(np.isin(apostes[1], nums[i]).sum()))
+
+    encerts_a = np.array(encerts_a, dtype=np.int64)
+    encerts_b = np.array(encerts_b, dtype=np.int64)
+    return {
+        "sorteigs": len(encerts_a),
+        "mitjana_a": float(encerts_a.mean()) if len(encerts_a) else 0.0,
+        "mitjana_b": float(encerts_b.mean()) if len(encerts_b) else 0.0,
+        # Quants sorteigs amb 0, 1, ..., 6 encerts
+        "distribucio_a": np.bincount(encerts_a, minlength=7).tolist(),
+        "distribucio_b": np.bincount(encerts_b, minlength=7).tolist(),
+        "distribucio_millor": np.bincount(np.maximum(encerts_a, encerts_b), minlength=7).tolist(),
+    }
+
+
+def _backtest_params(args):
+    dies, nums, params = args
+    return params, backtest(dies, nums, params)
+
+
+def escombrat(dies, nums, graella=GRAELLA_PER_DEFECTE, processos=None):
+    # Prova totes les combinacions de la graella en paral·lel (un procés per combinació)
+    noms = list(graella)
+    combinacions = [dict(zip(noms, valors)) for valors in product(*graella.values())]
+    with ProcessPoolExecutor(max_workers=processos) as pool:
+        resultats = list(pool.map(_backtest_params, [(dies, nums, p) for p in combinacions]))
+    return sorted(resultats, key=lambda r: r[1]["mitjana_a"], reverse=True)
+
+
+if __name__ == "__main__":
+    # python LottoLib.py  ->  escombrat de paràmetres sobre el magatzem local
+    dies, nums = carregar_magatzem()
+    print(f"Backtest sobre {len(dies)} sorteigs guardats")
+    for params, resum in escombrat(dies, nums):
+        print(
+            f"{params}  mitjana A={resum['mitjana_a']:.3f} B={resum['mitjana_b']:.3f}  "
+            f"encerts A (0..6)={resum['distribucio_a']}  millor={resum['distribucio_millor']}"
+        )
@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import wait
+import TelegramLib as tl
+
+# --- SUBSCRIPCIONS I DIFUSIÓ DE RESUMS ---
+# Els usuaris se subscriuen des del bot als resums diaris. Cada resum es genera
+# un sol cop i es reparteix a tots els subscriptors a través de la cua de
+# TelegramLib (limitada: si s'omple, la difusió espera), de manera que el cost
+# de generar-lo no depèn de quants subscriptors hi ha. Al ritme global de
+# Telegram (~30 missatges/s) 10.000 xats triguen uns 6 minuts; el que no
+# s'ha enviat dins de TERMINI_DIFUSIO es cancel·la.
+FITXER_SUBSCRIPCIONS = "subscripcions.json"
+DIGESTS = {
+    "lectures": "Lectures del dia",
+    "temperatura": "Temperatura d'avui al Masnou",
+    "diesel": "Preus del diesel",
+    "preus": "Preus de les cryptos",
+}
+TERMINI_DIFUSIO = 15 * 60   # segons en què s'ha d'haver lliurat tot un resum
+
+_subscripcions = None       # digest -> set de chat_id
+_lock_subscripcions = threading.Lock()
+
+
+def _carregar():
+    global _subscripcions
+    if _subscripcions is None:
+        try:
+            with open(FITXER_SUBSCRIPCIONS, encoding="utf-8") as f:
+                guardades = json.load(f)
+        except (OSError, ValueError):
+            guardades = {}
+        _subscripcions = {digest: set(guardades.get(digest, [])) for digest in DIGESTS}
+    return _subscripcions
+
+
+def _guardar():
+    temporal = FITXER_SUBSCRIPCIONS + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump({digest: sorted(chats) for digest, chats in _subscripcions.items()}, f)
+    os.replace(temporal, FITXER_SUBSCRIPCIONS)
+
+
+def subscriure(chat_id, digest):
+    # Retorna False si ja hi estava subscrit
+    if digest not in DIGESTS:
+        raise ValueError(f"Resum desconegut: {digest}")
+    with _lock_subscripcions:
+        chats = _carregar()[digest]
+        if str(chat_id) in chats:
+            return False
+        chats.add(str(chat_id))
+        _guardar()
+        return True
+
+
+def donar_de_baixa(chat_id, digest=None):
+    # Sense digest, dona de baixa el xat de tots els resums. Retorna de quants.
+    with _lock_subscripcions:
+        subscripcions = _carregar()
+        baixes = 0
+        for nom in ([digest] if digest else list(subscripcions)):
+            if str(chat_id) in subscripcions.get(nom, ()):
+                subscripcions[nom].discard(str(chat_id))
+                baixes += 1
+        if baixes:
+            _guardar()
+        return baixes
+
+
+def subscripcions_de(chat_id):
+    with _lock_subscripcions:
+        return sorted(nom for nom, chats in _carregar().items() if str(chat_id) in chats)
+
+
+def subscriptors(digest):
+    with _lock_subscripcions:
+        return sorted(_carregar().get(digest, ()))
+
+
+def recomptes():
+    with _lock_subscripcions:
+        return {nom: len(chats) for nom, chats in _carregar().items()}
+
+
+def difondre(digest, text, token=None, parse_mode=None):
+    # Envia el mateix text a tots els subscriptors del resum i espera el lliurament
+    # com a molt TERMINI_DIFUSIO segons: el que encara és a la cua llavors es
+    # cancel·la (un resum que arriba tard ja no serveix). Retorna (lliurats,
+    # subscriptors, segons).
+    chats = subscriptors(digest)
+    inici = time.monotonic()
+    limit = inici + TERMINI_DIFUSIO
+    futurs = []
+    for chat_id in chats:
+        if time.monotonic() >= limit:
+            break
+        futurs.append(tl.enviar(text, chat_id=chat_id, token=token, parse_mode=parse_mode))
+    _, pendents = wait(futurs, timeout=max(0, limit - time.monotonic()))
+    cancellats = sum(1 for futur in pendents if futur.cancel()) + len(chats) - len(futurs)
+    if cancellats:
+        print(f"⚠️ La difusió de {digest} ha superat el termini de {TERMINI_DIFUSIO} s: {cancellats} missatges no enviats")
+    lliurats = sum(1 for futur in futurs if futur.done() and not futur.cancelled()
+                   and futur.exception() is None and futur.result())
+    durada = time.monotonic() - inici
+    print(f"📣 {digest}: {lliurats}/{len(chats)} lliurats en {durada:.1f} s")
+    return lliurats, len(chats), durada
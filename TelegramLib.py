@@ -0,0 +1,170 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+import requests
+from concurrent.futures import Future
+from requests.adapters import HTTPAdapter
+
+# --- ENVIAMENT DE MISSATGES A TELEGRAM ---
+# Un sol punt de sortida per a tots els scripts: sessió HTTP compartida (les
+# connexions es reutilitzen), una cua d'enviament servida per uns quants fils
+# i els límits de Telegram:
+#   - global: ~30 missatges/segon per bot
+#   - per xat: 1 missatge/segon als privats, 20/minut als grups (id negatiu)
+# Els 429 es reintenten quan diu el retry_after de Telegram; els 5xx i els
+# errors de xarxa, amb backoff exponencial.
+# URL_TELEGRAM es pot apuntar a un servidor local fals per fer proves.
+URL_TELEGRAM = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+LIMIT_GLOBAL = 30          # missatges per segon
+INTERVAL_PRIVAT = 1.0      # segons entre missatges al mateix xat privat
+INTERVAL_GRUP = 3.0        # segons entre missatges al mateix grup
+MAX_INTENTS = 5
+BACKOFF_BASE = 1
+TIMEOUT = 15
+FILS_ENVIAMENT = 4
+MIDA_CUA = 10000
+
+_pendents = []             # heap de (moment en què es pot enviar, ordre, feina)
+_ordre = itertools.count()
+_cond = threading.Condition()
+_proper_xat = {}           # chat_id -> primer moment en què s'hi pot tornar a enviar
+_proper_global = 0.0
+_fils = []
+_sessio = None
+
+
+def _sessio_http():
+    global _sessio
+    if _sessio is None:
+        _sessio = requests.Session()
+        _sessio.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=FILS_ENVIAMENT))
+        _sessio.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=FILS_ENVIAMENT))
+    return _sessio
+
+
+def _token_per_defecte():
+    return os.getenv("BOT_TOKEN") or os.getenv("TOKEN_TELEGRAM")
+
+
+def _interval_xat(chat_id):
+    return INTERVAL_GRUP if str(chat_id).startswith("-") else INTERVAL_PRIVAT
+
+
+def _encuar(moment, feina):
+    heapq.heappush(_pendents, (moment, next(_ordre), feina))
+    _cond.notify_all()
+
+
+def _agafar_feina():
+    # Espera fins que hi ha una feina que es pot enviar respectant els límits
+    global _proper_global
+    with _cond:
+        while True:
+            ara = time.monotonic()
+            if _pendents and _pendents[0][0] <= ara and _proper_global <= ara:
+                _, _, feina = heapq.heappop(_pendents)
+                proper = _proper_xat.get(feina["chat_id"], 0.0)
+                if proper > ara:
+                    # Aquest xat encara no pot rebre: la feina torna a la cua
+                    _encuar(proper, feina)
+                    continue
+                if not feina["iniciada"]:
+                    # Un missatge cancel·lat mentre esperava a la cua no s'envia
+                    if not feina["futur"].set_running_or_notify_cancel():
+                        _cond.notify_all()
+                        continue
+                    feina["iniciada"] = True
+                _proper_xat[feina["chat_id"]] = ara + _interval_xat(feina["chat_id"])
+                _proper_global = ara + 1 / LIMIT_GLOBAL
+                _cond.notify_all()
+                return feina
+            if _pendents:
+                _cond.wait(max(_pendents[0][0], _proper_global) - ara)
+            else:
+                _cond.wait()
+
+
+def _reintentar(feina, espera, error):
+    feina["intents"] += 1
+    if feina["intents"] >= MAX_INTENTS:
+        print(f"⚠️ Missatge a {feina['chat_id']} descartat després de {MAX_INTENTS} intents: {error}")
+        feina["futur"].set_result(False)
+        return
+    with _cond:
+        _encuar(time.monotonic() + espera, feina)
+
+
+def _enviar_ara(feina):
+    url = f"{URL_TELEGRAM}/bot{feina['token']}/sendMessage"
+    try:
+        r = _sessio_http().post(url, data=feina["dades"], timeout=TIMEOUT)
+    except requests.RequestException as e:
+        _reintentar(feina, BACKOFF_BASE * 2 ** feina["intents"], e)
+        return
+
+    if r.status_code == 200:
+        feina["futur"].set_result(True)
+    elif r.status_code == 429:
+        try:
+            espera = r.json()["parameters"]["retry_after"]
+        except (ValueError, KeyError, TypeError):
+            espera = BACKOFF_BASE * 2 ** feina["intents"]
+        with _cond:
+            # El límit és del xat: cap altre missatge hi pot anar abans
+            _proper_xat[feina["chat_id"]] = time.monotonic() + espera
+        _reintentar(feina, espera, "429")
+    elif r.status_code >= 500:
+        _reintentar(feina, BACKOFF_BASE * 2 ** feina["intents"], r.status_code)
+    else:
+        print(f"⚠️ Telegram ha rebutjat el missatge a {feina['chat_id']}: {r.status_code} {r.text[:200]}")
+        feina["futur"].set_result(False)
+
+
+def _bucle_enviament():
+    while True:
+        feina = _agafar_feina()
+        try:
+            _enviar_ara(feina)
+        except Exception as e:
+            feina["futur"].set_exception(e)
+
+
+def _iniciar_fils():
+    with _cond:
+        if _fils:
+            return
+        for i in range(FILS_ENVIAMENT):
+            fil = threading.Thread(target=_bucle_enviament, name=f"telegram-{i}", daemon=True)
+            fil.start()
+            _fils.append(fil)
+
+
+def enviar(text, chat_id=None, token=None, parse_mode=None):
+    # Encua el missatge i retorna un Future que acaba a True si s'ha lliurat.
+    # Si la cua és plena, espera que hi hagi lloc. Mentre el missatge espera a
+    # la cua, futur.cancel() el treu de l'enviament.
+    chat_id = chat_id or os.getenv("CHAT_ID")
+    token = token or _token_per_defecte()
+    futur = Future()
+    if not token or not chat_id:
+        print("Error: Falta el token del bot o el CHAT_ID al fitxer .env")
+        futur.set_result(False)
+        return futur
+
+    dades = {"chat_id": chat_id, "text": text}
+    if parse_mode:
+        dades["parse_mode"] = parse_mode
+    feina = {"chat_id": str(chat_id), "token": token, "dades": dades, "intents": 0, "iniciada": False, "futur": futur}
+    _iniciar_fils()
+    with _cond:
+        while len(_pendents) >= MIDA_CUA:
+            _cond.wait()
+        _encuar(time.monotonic(), feina)
+    return futur
+
+
+def enviar_i_esperar(text, chat_id=None, token=None, parse_mode=None):
+    # Per als scripts que envien i acaben
+    return enviar(text, chat_id, token, parse_mode).result()
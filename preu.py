@@ -1,53 +1,65 @@
+import sys
 import time
-import yfinance as yf
-import requests
 from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv #Importem la funció per carregar .env
+import AlertesLib as al
+import TelegramLib as tl
 
 load_dotenv() 
 
 TOKEN_TELEGRAM = os.getenv("BOT_TOKEN")
 CHAT_ID = os.getenv("CHAT_ID")
 
-# Parell i Llindar de preu
+# Regla inicial si encara no n'hi ha cap de guardada. La resta de parells i
+# llindars es gestionen amb AlertesLib (es desen a regles_alertes.json).
 parell = "DOGE-USD"
 PREU_ENTRADA = 0.243  
 PREU_SORTIDA = 0.273
 
+# Mode de seguiment (python preu.py [streaming|polling]):
+#   streaming: subscripció WebSocket, cada preu s'avalua tan bon punt arriba
+#   polling:   tots els parells d'una sola baixada cada ESPERA segons
+MODE = sys.argv[1] if len(sys.argv) > 1 else "streaming"
+ESPERA = 900
+
 proper_avis = datetime.now()
-c = 0
 
 # Funció per enviar missatge a Telegram
+# (no esperem el lliurament: la cua de TelegramLib reintenta i respecta els límits)
 def envia_missatge(text):
-    url = f"https://api.telegram.org/bot{TOKEN_TELEGRAM}/sendMessage"
-    params = {"chat_id": CHAT_ID, "text": text}
-    requests.get(url, params=params)
+    tl.enviar(text, chat_id=CHAT_ID, token=TOKEN_TELEGRAM)
+
+# Avís cada cert temps amb l'últim preu de cada parell
+def avis_periodic(preus):
+    global proper_avis
+    if preus and datetime.now() >= proper_avis:
+        envia_missatge("\n".join(f"{p} està a {v:.3f}" for p, v in sorted(preus.items())))
+        proper_avis = datetime.now() + timedelta(hours=24)
+
+if not al.regles():
+    al.afegir_regla(parell, entrada=PREU_ENTRADA, sortida=PREU_SORTIDA)
+
+if MODE == "streaming":
+    ultims_preus = {}
+
+    def en_tick(parell_tick, preu):
+        ultims_preus[parell_tick] = preu
+        avis_periodic(ultims_preus)
+
+    # Bloqueja: reconnecta sol si el WebSocket es talla
+    al.escoltar(envia_missatge, en_tick=en_tick)
 
 # Bucle de monitoratge
 while True:
 
     try:
-        ticker = yf.Ticker(parell)
-        preu_actual = ticker.history(period="1d", interval="1m")["Close"][-1]
-        
-        # Llindars de preu
-        if preu_actual >= PREU_ENTRADA and c < 4:
-            envia_missatge(f"{parell} preu entrada {preu_actual:.3f}")
-            c += 1             
-        if preu_actual <= PREU_SORTIDA and c < 4:
-            envia_missatge(f"{parell} preu sortida {preu_actual:.3f}")
-            c += 1             
-
-        # Avís cada cert temps
-        if datetime.now() >= proper_avis:
-            envia_missatge(f"{parell} està a {preu_actual:.3f}")
-            proper_avis = datetime.now() + timedelta(hours=24)
+        # Cada regla porta el seu estat (histèresi i cooldown): no cal comptador global
+        avis_periodic(al.tick(envia_missatge))
             
     except Exception as e:
         # print("Error:", e)
         envia_missatge(f"Error:{e}")
 
     # espera en segons
-    time.sleep(900)
-
+    time.sleep(ESPERA)
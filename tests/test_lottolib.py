@@ -0,0 +1,35 @@
+import os
+import sys
+from datetime import datetime, time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import LottoLib as lt
+
+
+def _sorteigs_diaris(n=300, llavor=7):
+    # Un sorteig diari amb 6 números diferents de l'1 al 49, ordenats
+    rng = np.random.default_rng(llavor)
+    dies = np.datetime64("2024-01-01") + np.arange(n).astype("timedelta64[D]")
+    nums = np.sort(np.array([rng.choice(np.arange(1, 50), 6, replace=False) for _ in range(n)]), axis=1)
+    return dies, nums.astype(np.uint8)
+
+
+def test_backtest_reprodueix_la_recomanacio_del_bot():
+    # Per a cada dia, les apostes del backtest han de ser les que el bot dona a
+    # mig matí (abans del sorteig) amb els sorteigs anteriors
+    dies, nums = _sorteigs_diaris()
+    historiques = list(lt.apostes_historiques(dies, nums, lt.PARAMS_PER_DEFECTE))
+    assert len(historiques) == len(dies) - lt.PARAMS_PER_DEFECTE["dies_biaix"]
+    for i, apostes in historiques:
+        avui = datetime.combine(dies[i].astype(datetime), time(10))
+        assert lt.recomanacio(dies[:i], nums[:i], avui) == apostes
+
+
+def test_recomanacio_nomes_depen_del_dia():
+    dies, nums = _sorteigs_diaris(120)
+    dia = dies[-1].astype(datetime)
+    mitjanit = lt.recomanacio(dies, nums, datetime.combine(dia, time(0)))
+    assert lt.recomanacio(dies, nums, datetime.combine(dia, time(10))) == mitjanit
+    assert lt.recomanacio(dies, nums, datetime.combine(dia, time(23, 59))) == mitjanit